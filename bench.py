@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import scipy
+
+import func as f
+
+InitialAssetPrice = 1
+RiskFreeReturn = .05
+Volatility = .2
+Time = 1
+MaxIteration = 10000
+Precision = 1.0e-8
+RandomSeed = 1
+
+
+def generateCases(Quick=False):
+    """ Benchmark cases
+        This method lists the benchmarks of the pricing and inversion hot
+        paths, for increasing grid sizes, path counts and step counts.
+
+        Parameters
+            Quick : True to run only the smallest sizes
+
+        Returns
+            The list of the cases, each one a tuple with the name, the
+            dictionary of the parameters and the function to measure
+    """
+    Cases = []
+    PathsSizes = [1000] if Quick else [1000, 10000]
+    StepsSizes = [100] if Quick else [100, 1000]
+    GridSizes = [5] if Quick else [5, 10, 20]
+    for Paths in PathsSizes:
+        for Steps in StepsSizes:
+            NormalMatrix = np.random.default_rng(RandomSeed).standard_normal((Steps, Paths))
+            Cases.append(('computeSinglePrice', {'paths': Paths, 'steps': Steps},
+                          lambda NormalMatrix=NormalMatrix, Paths=Paths, Steps=Steps: f.computeSinglePrice(
+                              Time/Steps, 1, Steps, Paths, InitialAssetPrice, RiskFreeReturn, Volatility,
+                              np.exp(-RiskFreeReturn*Time), NormalMatrix)))
+            for Grid in GridSizes:
+                TimesArray, StrikeArray = np.linspace(0.5, 2, Grid), np.linspace(0.5, 1.5, Grid)
+                Cases.append(('generatePricesMatrix', {'paths': Paths, 'steps': Steps, 'grid': Grid},
+                              lambda TimesArray=TimesArray, StrikeArray=StrikeArray, Paths=Paths, Steps=Steps:
+                              f.generatePricesMatrix(TimesArray, StrikeArray, Steps, Paths, InitialAssetPrice,
+                                                     RiskFreeReturn, Volatility, RandomSeed)))
+            Cases.append(('generatePricesMatrix', {'paths': Paths, 'steps': Steps, 'grid': GridSizes[-1],
+                                                   'dtype': 'float32'},
+                          lambda Grid=GridSizes[-1], Paths=Paths, Steps=Steps: f.generatePricesMatrix(
+                              np.linspace(0.5, 2, Grid), np.linspace(0.5, 1.5, Grid), Steps, Paths,
+                              InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, DataType='float32')))
+    Cases.append(('blackScholesCallPrice', {'grid': 1},
+                  lambda: f.blackScholesCallPrice(InitialAssetPrice, 1, Time, RiskFreeReturn, Volatility)))
+    Cases.append(('findImpliedVolatility', {'grid': 1},
+                  lambda: f.findImpliedVolatility(0.1, InitialAssetPrice, 1, Time, RiskFreeReturn, MaxIteration,
+                                                  Precision)))
+    for Grid in GridSizes + ([] if Quick else [100]):
+        TimesArray, StrikeArray = np.linspace(0.5, 2, Grid), np.linspace(0.5, 1.5, Grid)
+        PricesMatrix = f.blackScholesCallPrice(InitialAssetPrice, StrikeArray[np.newaxis,:],
+                                               TimesArray[:,np.newaxis], RiskFreeReturn, Volatility)
+        Cases.append(('blackScholesCallPrice', {'grid': Grid},
+                      lambda TimesArray=TimesArray, StrikeArray=StrikeArray: f.blackScholesCallPrice(
+                          InitialAssetPrice, StrikeArray[np.newaxis,:], TimesArray[:,np.newaxis], RiskFreeReturn,
+                          Volatility)))
+        Cases.append(('findImpliedVolatilityMatrix', {'grid': Grid},
+                      lambda TimesArray=TimesArray, StrikeArray=StrikeArray, PricesMatrix=PricesMatrix:
+                      f.findImpliedVolatilityMatrix(PricesMatrix, InitialAssetPrice, StrikeArray, TimesArray,
+                                                    RiskFreeReturn, MaxIteration, Precision)))
+    return Cases
+
+
+def caseKey(Name, Parameters):
+    """ Benchmark key
+        This method builds the unique key of a case from its name and parameters.
+
+        Parameters
+            Name : the name of the measured function
+            Parameters : the dictionary of the parameters of the case
+
+        Returns
+            The key, like 'generatePricesMatrix[grid=10,paths=1000,steps=100]'
+    """
+    return Name + '[' + ','.join(str(Key) + '=' + str(Parameters[Key]) for Key in sorted(Parameters)) + ']'
+
+
+def measureCase(Function, Repeat):
+    """ Measure a case
+        This method times the function the given number of times and then
+        runs it once more under tracemalloc to measure its peak memory.
+        The standard output of the function is discarded.
+
+        Parameters
+            Function : the function without arguments to measure
+            Repeat : the number of timed runs
+
+        Returns
+            The dictionary with the median and minimum time in seconds and
+            the peak of the allocated memory in bytes
+    """
+    Times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(Repeat):
+            InitialTime = time.perf_counter()
+            Function()
+            Times.append(time.perf_counter()-InitialTime)
+        tracemalloc.start()
+        try:
+            Function()
+            PeakMemory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'time': float(np.median(Times)), 'min': min(Times), 'peak_memory': PeakMemory}
+
+
+def runBenchmarks(Repeat=3, Quick=False, Filter=None):
+    """ Run the benchmarks
+        This method measures all the cases and collects the results with
+        the description of the environment.
+
+        Parameters
+            Repeat : the number of timed runs of each case
+            Quick : True to run only the smallest sizes
+            Filter : a substring of the keys of the cases to run, None for all
+
+        Returns
+            The dictionary with the environment and the results of each case
+    """
+    Results = {}
+    for Name, Parameters, Function in generateCases(Quick):
+        Key = caseKey(Name, Parameters)
+        if Filter and Filter not in Key:
+            continue
+        Results[Key] = dict(measureCase(Function, Repeat), name=Name, params=Parameters)
+        print(Key, 'Time: ', Results[Key]['time'], 'Peak memory: ', Results[Key]['peak_memory'])
+    return {'metadata': {'date': datetime.now().isoformat(), 'python': platform.python_version(),
+                         'numpy': np.__version__, 'scipy': scipy.__version__, 'platform': platform.platform(),
+                         'repeat': Repeat},
+            'results': Results}
+
+
+def compareResults(Baseline, Current, Threshold=0.2):
+    """ Compare two benchmark results
+        This method compares the minimum time, that is the least noisy
+        measure, and the peak memory of the cases that are in both the
+        results and flags the regressions, that are the ratios between
+        the current and the baseline values greater than 1 + Threshold.
+
+        Parameters
+            Baseline : the dictionary of the baseline results
+            Current : the dictionary of the current results
+            Threshold : the tolerated relative increase
+
+        Returns
+            The list of the comparisons, each one a dictionary with the key
+            of the case, the measure, the two values, their ratio and the
+            regression flag
+    """
+    Comparisons = []
+    for Key in sorted(set(Baseline['results']) & set(Current['results'])):
+        for Measure in ('min', 'peak_memory'):
+            Old, New = Baseline['results'][Key][Measure], Current['results'][Key][Measure]
+            Ratio = New/Old if Old > 0 else (1.0 if New == 0 else float('inf'))
+            Comparisons.append({'key': Key, 'measure': Measure, 'baseline': Old, 'current': New,
+                                'ratio': Ratio, 'regression': Ratio > 1+Threshold})
+    return Comparisons
+
+
+def main(Arguments=None):
+    """ Command line
+        This method runs the benchmarks or compares two results.
+
+        Parameters
+            Arguments : the list of the command line arguments, None for sys.argv
+
+        Returns
+            The exit status, 1 if a regression has been found
+    """
+    Parser = argparse.ArgumentParser(description='Benchmarks of the pricing and inversion hot paths')
+    Commands = Parser.add_subparsers(dest='command', required=True)
+    Run = Commands.add_parser('run', help='run the benchmarks and save the results as JSON')
+    Run.add_argument('--output', default='bench_results.json', help='path of the JSON results')
+    Run.add_argument('--repeat', type=int, default=3, help='number of timed runs of each case')
+    Run.add_argument('--quick', action='store_true', help='run only the smallest sizes')
+    Run.add_argument('--filter', default=None, help='run only the cases whose key contains this text')
+    Compare = Commands.add_parser('compare', help='compare the results with a saved baseline')
+    Compare.add_argument('baseline', help='path of the JSON baseline results')
+    Compare.add_argument('current', help='path of the JSON current results')
+    Compare.add_argument('--threshold', type=float, default=0.2, help='tolerated relative increase')
+    Arguments = Parser.parse_args(Arguments)
+    if Arguments.command == 'run':
+        Results = runBenchmarks(Arguments.repeat, Arguments.quick, Arguments.filter)
+        with open(Arguments.output, 'w') as File:
+            json.dump(Results, File, indent=2)
+        return 0
+    with open(Arguments.baseline) as File:
+        Baseline = json.load(File)
+    with open(Arguments.current) as File:
+        Current = json.load(File)
+    Comparisons = compareResults(Baseline, Current, Arguments.threshold)
+    for Comparison in Comparisons:
+        print('REGRESSION' if Comparison['regression'] else 'ok        ', Comparison['key'],
+              Comparison['measure'], 'ratio: ', round(Comparison['ratio'], 3))
+    return 1 if any(Comparison['regression'] for Comparison in Comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+import func as f
+
+
+def computeCacheKey(Inputs):
+    """ Cache key
+        This method hashes all the inputs of the pricing, together with the
+        engine and numpy versions, so that the same inputs always give the
+        same key and any change of the inputs or of the engine gives a new one.
+
+        Parameters
+            Inputs : the dictionary of the inputs, with numbers, strings,
+                     arrays or lists as values
+
+        Returns
+            The hexadecimal SHA-256 key
+    """
+    Normalized = {Name: (np.asarray(Value).tolist() if isinstance(Value, (np.ndarray, np.generic)) else Value)
+                  for Name, Value in Inputs.items()}
+    Normalized['EngineVersion'] = f.EngineVersion
+    Normalized['NumpyVersion'] = np.__version__
+    Text = json.dumps(Normalized, sort_keys=True, default=str)
+    return hashlib.sha256(Text.encode()).hexdigest()
+
+
+def cachePath(Directory, Key):
+    """ Cache file path
+        This method builds the path of the file of a key.
+
+        Parameters
+            Directory : the cache directory
+            Key : the cache key
+
+        Returns
+            The path of the .npz file
+    """
+    return os.path.join(Directory, Key + '.npz')
+
+
+def readSurface(Path):
+    """ Read a surface
+        This method reads the matrices of a surface stored in a .npz file.
+
+        Parameters
+            Path : the path of the file
+
+        Returns
+            The dictionary of the matrices, None if the file cannot be read
+            or is corrupt
+    """
+    try:
+        with np.load(Path) as Data:
+            return {Name: Data[Name] for Name in Data.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+
+
+def writeSurface(Path, Surface):
+    """ Write a surface
+        This method stores the matrices of the surface in a compressed .npz
+        file, written to a temporary file and then renamed, so that a
+        concurrent reader never sees a partial file.
+
+        Parameters
+            Path : the path of the file
+            Surface : the dictionary of the matrices
+    """
+    Directory = os.path.dirname(os.path.abspath(Path))
+    os.makedirs(Directory, exist_ok=True)
+    Descriptor, TemporaryPath = tempfile.mkstemp(dir=Directory, suffix='.tmp')
+    try:
+        with os.fdopen(Descriptor, 'wb') as File:
+            np.savez_compressed(File, **Surface)
+        os.replace(TemporaryPath, Path)
+    except BaseException:
+        os.remove(TemporaryPath)
+        raise
+
+
+def loadSurface(Directory, Key):
+    """ Load a cached surface
+        This method reads the matrices stored for the key, and removes the
+        entry if it is corrupt, so that it is computed and stored again.
+
+        Parameters
+            Directory : the cache directory
+            Key : the cache key
+
+        Returns
+            The dictionary of the matrices, None if the key is not cached
+    """
+    Path = cachePath(Directory, Key)
+    Surface = readSurface(Path)
+    if Surface is None and os.path.exists(Path):
+        try:
+            os.remove(Path)
+        except OSError:
+            pass
+    return Surface
+
+
+def saveSurface(Directory, Key, Surface):
+    """ Save a surface
+        This method stores the matrices of the surface for the key.
+
+        Parameters
+            Directory : the cache directory
+            Key : the cache key
+            Surface : the dictionary of the matrices
+    """
+    writeSurface(cachePath(Directory, Key), Surface)
+
+
+def evictCache(Directory, MaxSize=None, MaxAge=None, Keep=None):
+    """ Cache eviction
+        This method removes the cached surfaces older than the max age and
+        then the oldest ones until the cache fits in the max size, but never
+        the kept one, e.g. the surface just saved.
+
+        Parameters
+            Directory : the cache directory
+            MaxSize : the max size of the cache in bytes, None for no limit
+            MaxAge : the max age of the cached surfaces in seconds, None for no limit
+            Keep : the key that is never removed, None for no such key
+
+        Returns
+            The list of the removed keys
+    """
+    if not os.path.isdir(Directory):
+        return []
+    Entries = []
+    for Name in os.listdir(Directory):
+        if Name.endswith('.npz'):
+            Status = os.stat(os.path.join(Directory, Name))
+            Entries.append((Status.st_mtime, Status.st_size, Name))
+    Entries.sort()
+    Now = time.time()
+    TotalSize = sum(Size for Modified, Size, Name in Entries)
+    Removed = []
+    for Modified, Size, Name in Entries:
+        if Name == (Keep or '') + '.npz':
+            continue
+        if (MaxAge is not None and Now-Modified > MaxAge) or (MaxSize is not None and TotalSize > MaxSize):
+            os.remove(os.path.join(Directory, Name))
+            TotalSize -= Size
+            Removed.append(Name[:-len('.npz')])
+    return Removed
@@ -1,7 +1,8 @@
 import numpy as np
-from scipy import stats
 import warnings
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from instrumentation import Quiet, runInstrumented
 
 
 def computeSinglePrice(DeltaTime, Strike, IntervalsNumber, SimulationNumbers, InitialAssetPrice,
@@ -24,21 +25,1117 @@ def computeSinglePrice(DeltaTime, Strike, IntervalsNumber, SimulationNumbers, In
         Returns
             The expectation value of the Call price given the parameters
     """
-    PriceArray = np.empty((SimulationNumbers)); PriceArray.fill(InitialAssetPrice)
-    VolatilityArray = np.empty((SimulationNumbers)); VolatilityArray.fill(Volatility)
+    PriceArray = np.full(SimulationNumbers, InitialAssetPrice, dtype=float)
     for j in range(IntervalsNumber):
         dw = np.sqrt(DeltaTime)*NormalMatrix[j,:]
-        PriceArray = PriceArray*(1+RiskFreeReturn*DeltaTime)+np.multiply(VolatilityArray,dw)
-        Payoff = np.maximum(PriceArray-Strike,0).mean()
+        PriceArray = PriceArray*(1+RiskFreeReturn*DeltaTime)+Volatility*dw
+    Payoff = np.maximum(PriceArray-Strike,0).mean()
     return Payoff*AttualizationFactor
 
+def computePricesArray(DeltaTime, StrikeArray, IntervalsNumber, SimulationNumbers, InitialAssetPrice,
+                       RiskFreeReturn, Volatility, AttualizationFactor, NormalMatrix):
+    """ Compute the Call Prices for all the strikes
+        This method implement the Monte Carlo and Euler methods as
+        computeSinglePrice, but the trajectories of the underlying asset
+        are evolved only once and the payoff is evaluated for all the
+        strikes at the same time, since the paths do not depend on the strike
+
+        Parameters
+            DeltaTime : the amplitude of a each time intervals
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            SimulationNumbers : the number of simulation for the Montecarlo method
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            AttualizationFactor : the factor that has to applied to the payoff to obtain the price
+            NormalMatrix : a matrix of normal obsevation with dimensions IntervalsNumber x SimulationNumbers
+
+        Returns
+            An array with the expectation value of the Call price for each strike
+    """
+    StrikeArray = np.asarray(StrikeArray, dtype=float)
+    PriceArray = np.full(SimulationNumbers, InitialAssetPrice, dtype=float)
+    for j in range(IntervalsNumber):
+        dw = np.sqrt(DeltaTime)*NormalMatrix[j,:]
+        PriceArray = PriceArray*(1+RiskFreeReturn*DeltaTime)+Volatility*dw
+    # Strikes on the rows, so that each mean is taken along a contiguous axis
+    Payoff = np.maximum(PriceArray[np.newaxis,:]-StrikeArray[:,np.newaxis],0).mean(axis=1)
+    return Payoff*AttualizationFactor
+
+# Version of the results of the engine, to be increased when a change of the
+# code changes the prices of the same inputs or the matrices of the surfaces,
+# so that the cached surfaces expire
+EngineVersion = 5
+
+VarianceReductions = ('antithetic', 'control', 'sobol')
+Engines = ('euler', 'terminal')
+DataTypes = ('float64', 'float32')
+Backends = ('numpy', 'numba')
+# The Monte Carlo Greeks, in the order of the rows of their statistics
+GreekNames = ('Delta', 'Gamma', 'Vega', 'Theta')
+
+def checkEngine(Engine):
+    """ Path engine
+        This method checks the name of the engine that evolves the paths:
+        'euler' for the Euler scheme of the arithmetic dynamics through
+        all the time intervals, 'terminal' for the exact sampling of the
+        final price of the same Euler scheme, that is a normal, with one
+        normal for each path, that is enough for the vanilla calls.
+
+        Parameters
+            Engine : the name of the engine
+
+        Returns
+            The lowercase name of the engine
+    """
+    Engine = Engine.strip().lower()
+    if Engine not in Engines:
+        raise ValueError("Unknown path engine: " + Engine)
+    return Engine
+
+def checkDataType(DataType, Backend='numpy'):
+    """ Data type of the paths
+        This method checks the floating point type of the paths and of the
+        payoffs: 'float64', or 'float32' that halves the memory traffic,
+        with a relative rounding of about 1e-7 well below the Monte Carlo
+        noise. The sums of the payoffs are always taken in float64. The
+        numba kernel keeps the paths in float64 registers, so with the
+        numba backend float64 is used, with a warning.
+
+        Parameters
+            DataType : the name of the type or a numpy type
+            Backend : the backend of the paths, as returned by checkBackend
+
+        Returns
+            The numpy.dtype that is used
+    """
+    DataType = np.dtype(DataType.strip().lower() if isinstance(DataType, str) else DataType)
+    if DataType.name not in DataTypes:
+        raise ValueError("Unknown data type of the paths: " + DataType.name)
+    if Backend == 'numba' and DataType != np.float64:
+        warnings.warn('The numba backend evolves the paths in float64, ' + DataType.name + ' is not used')
+        DataType = np.dtype(np.float64)
+    return DataType
+
+def checkBackend(Backend):
+    """ Backend of the paths
+        This method checks the name of the backend that evolves the paths:
+        'numpy' for the vectorized steps over all the paths of a block,
+        'numba' for the compiled kernel that fuses the normals, the steps
+        and the payoffs of each path. Without numba installed the numpy
+        backend is used, with a warning. The kernel, and numba, are
+        imported only when they are requested.
+
+        Parameters
+            Backend : the name of the backend
+
+        Returns
+            The lowercase name of the backend that is used
+    """
+    Backend = Backend.strip().lower()
+    if Backend not in Backends:
+        raise ValueError("Unknown backend of the paths: " + Backend)
+    if Backend == 'numba':
+        import kernel
+    if Backend == 'numba' and not kernel.Available:
+        warnings.warn('numba is not installed, the numpy backend is used')
+        Backend = 'numpy'
+    return Backend
+
+def parseVarianceReduction(VarianceReduction):
+    """ Variance reduction techniques
+        This method reads the variance reduction techniques, given as a
+        comma separated string like 'antithetic, control' or as an
+        iterable of names.
+
+        Parameters
+            VarianceReduction : the techniques, None or 'none' for plain Monte Carlo
+
+        Returns
+            The frozenset with the names of the techniques
+    """
+    if VarianceReduction is None:
+        return frozenset()
+    if isinstance(VarianceReduction, str):
+        VarianceReduction = VarianceReduction.split(',')
+    Techniques = frozenset(Name.strip().lower() for Name in VarianceReduction) - {'', 'none'}
+    for Name in Techniques:
+        if Name not in VarianceReductions:
+            raise ValueError("Unknown variance reduction technique: " + Name)
+    if 'sobol' in Techniques and 'antithetic' in Techniques:
+        raise ValueError("The antithetic variates can not be used with the Sobol normals")
+    return Techniques
+
+# The number of samples of each random stream of the normals. The streams are
+# keyed by their index, so the paths do not depend on how the samples are split
+# in blocks, and the blocks are whole numbers of streams when the memory allows
+StreamSize = 2**12
+# The values of each step of the Sobol normals at the peak of their generation,
+# with the uniforms of the scrambled sequence. The direction numbers, that scipy
+# loads once for all the processes, are not counted
+SobolValues = 2
+# The float64 values of each path for the Greeks: the final price, the weights
+# of each Greek, the row of the estimators, its square and the in the money flags
+GreekValues = len(GreekNames)+4
+
+def computeBlockSize(MaxMemory, StrikesNumber, IntervalsNumber=0, VarianceReduction=None, DataType='float64',
+                     Greeks=False):
+    """ Paths block size
+        This method computes how many samples can be simulated at the
+        same time without exceeding the memory ceiling. For each path the
+        streaming engine keeps the asset price, the normal observation of
+        the current step, the drift of the float32 steps, one payoff for
+        each strike and a row of temporary values of the statistics; the
+        control variate adds its price, its payoffs and the temporary
+        values of its step, the antithetic variates evolve two paths for
+        each sample and the Sobol normals are generated, in float64, for
+        all the steps, with the temporary arrays of the scrambled sequence.
+        The Greeks add, in float64, the weights of each path and the rows
+        of their estimators. The block is rounded down to a whole number of
+        random streams, unless it is smaller than one stream or the normals
+        come from the Sobol sequence, that is not split in streams.
+
+        Parameters
+            MaxMemory : the memory ceiling in megabytes, None for no ceiling
+            StrikesNumber : the number of strikes priced on each path
+            IntervalsNumber : the number of intervals for the Euler method
+            VarianceReduction : the variance reduction techniques
+            DataType : the floating point type of the paths
+            Greeks : True if the Greeks are estimated from the paths
+
+        Returns
+            The number of samples of each block, None if there is no ceiling
+    """
+    if MaxMemory is None:
+        return None
+    Techniques = parseVarianceReduction(VarianceReduction)
+    ValuesPerPath = StrikesNumber+4
+    if 'control' in Techniques:
+        ValuesPerPath += StrikesNumber+3
+    PathsPerSample = 2 if 'antithetic' in Techniques else 1
+    BytesPerSample = checkDataType(DataType).itemsize*ValuesPerPath*PathsPerSample
+    if 'sobol' in Techniques:
+        BytesPerSample += SobolValues*np.dtype(np.float64).itemsize*IntervalsNumber
+    if Greeks:
+        BytesPerSample += GreekValues*np.dtype(np.float64).itemsize*PathsPerSample
+    BlockSize = max(1, int(MaxMemory*2**20)//BytesPerSample)
+    if BlockSize >= StreamSize and 'sobol' not in Techniques:
+        BlockSize -= BlockSize % StreamSize
+    return BlockSize
+
+def createStreams(RandomSeed, Start, BlockSize):
+    """ Random streams of a block
+        This method creates the generators of the random streams that cover
+        the samples of a block. The samples are grouped in streams of
+        StreamSize samples, each drawn from its own generator spawned from
+        the random seed with the index of the stream, so the normals of a
+        sample do not depend on the block that contains it.
+
+        Parameters
+            RandomSeed : the integer entropy of the random streams
+            Start : the index of the first sample of the block
+            BlockSize : the number of samples in the block
+
+        Returns
+            The list of the numpy.random.Generator of the streams, from the
+            one of the first sample of the block
+    """
+    return [np.random.default_rng(np.random.SeedSequence(RandomSeed, spawn_key=(Stream,)))
+            for Stream in range(Start//StreamSize, (Start+BlockSize-1)//StreamSize+1)]
+
+def drawStreamNormals(Generators, Start, NormalArray, Buffer):
+    """ Normals of a step
+        This method draws the normals of one time step of the samples of a
+        block. Each stream draws the normals of all its StreamSize samples,
+        also when the block covers only a part of it, so the position of
+        the normal of each sample in its stream does not depend on the block.
+
+        Parameters
+            Generators : the generators of the streams of createStreams
+            Start : the index of the first sample of the block
+            NormalArray : the array of the normals of the samples of the block
+            Buffer : an array of StreamSize values of the data type of the
+                      normals, for the streams that the block covers partially
+    """
+    Offset, Position = Start % StreamSize, 0
+    for Generator in Generators:
+        Count = min(StreamSize-Offset, len(NormalArray)-Position)
+        if Count == StreamSize:
+            Generator.standard_normal(dtype=NormalArray.dtype, out=NormalArray[Position:Position+Count])
+        else:
+            Generator.standard_normal(dtype=NormalArray.dtype, out=Buffer)
+            NormalArray[Position:Position+Count] = Buffer[Offset:Offset+Count]
+        Offset, Position = 0, Position+Count
+
+def generateSobolNormals(Generator, BlockSize, IntervalsNumber, Start=0):
+    """ Sobol normals
+        This method generates the normal observations of a block from a
+        scrambled Sobol sequence, with one dimension for each time step.
+        All the blocks are consecutive points of the same sequence.
+
+        Parameters
+            Generator : the numpy.random.Generator used to scramble the sequence
+            BlockSize : the number of points of the sequence
+            IntervalsNumber : the number of dimensions of the sequence
+            Start : the index of the first point of the block
+
+        Returns
+            The matrix of the normals with dimensions BlockSize x IntervalsNumber
+    """
+    from scipy import special
+    from scipy.stats import qmc
+    with warnings.catch_warnings():
+        # The balance properties warning for sizes that are not powers of two
+        warnings.simplefilter('ignore', UserWarning)
+        Sequence = qmc.Sobol(d=IntervalsNumber, scramble=True, seed=Generator)
+        if Start > 0:
+            Sequence.fast_forward(Start)
+        Uniforms = Sequence.random(BlockSize)
+    np.clip(Uniforms, np.finfo(float).tiny, 1-np.spacing(1.0), out=Uniforms)
+    return special.ndtri(Uniforms, out=Uniforms)
+
+def computeTerminalLaw(Time, IntervalsNumber, RiskFreeReturn, Volatility):
+    """ Terminal law of the Euler scheme
+        This method computes the law of the final price of the Euler scheme
+        S(j+1) = S(j)*A + sigma*sqrt(dt)*Z, with A = 1+r*dt, that is a
+        normal with mean S0*A^N and variance
+        V = sigma^2*dt*(1+A^2+...+A^(2N-2)).
+
+        Parameters
+            Time : the option expiration time
+            IntervalsNumber : the number of intervals for the Euler method
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+
+        Returns
+            The growth A^N of the mean and the standard deviation sqrt(V)
+    """
+    DeltaTime = Time/IntervalsNumber
+    Growth = 1+RiskFreeReturn*DeltaTime
+    Variance = Volatility**2*DeltaTime*(Growth**(2*np.arange(IntervalsNumber))).sum()
+    return Growth**IntervalsNumber, np.sqrt(Variance)
+
+def computeGreekWeights(Time, IntervalsNumber, InitialAssetPrice, RiskFreeReturn, Volatility):
+    """ Weights of the Monte Carlo Greeks
+        This method computes the coefficients of the estimators of the
+        Greeks, that on each path are the weight a+b*S of the final price S
+        when the call ends in the money, plus a multiple of the payoff.
+        The final price of the Euler scheme is a normal with mean S0*A^N,
+        A = 1+r*dt, and variance V = sigma^2*dt*(1+A^2+...+A^(2N-2)), linear
+        in S0 and sigma, so the delta, the vega and the theta are pathwise
+        derivatives and the gamma is the likelihood ratio of the normal
+        applied to the pathwise delta. The theta is the derivative with
+        respect to the calendar time, minus the one with respect to the
+        expiration time, with the same number of steps. Both the engines
+        sample this law, so they share the weights.
+
+        Parameters
+            Time : the option expiration time
+            IntervalsNumber : the number of intervals for the Euler method
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+
+        Returns
+            The matrix of the coefficients a and b with one row for each
+            Greek and the array of the multiples of the payoff
+    """
+    PayoffWeights = np.array([0, 0, 0, RiskFreeReturn], dtype=float)
+    DeltaTime = Time/IntervalsNumber
+    Growth = 1+RiskFreeReturn*DeltaTime
+    Steps = np.arange(IntervalsNumber)
+    Powers = Growth**(2*Steps)
+    Sensitivity, Deviation = computeTerminalLaw(Time, IntervalsNumber, RiskFreeReturn, Volatility)
+    # The variance and the derivatives with respect to the expiration time of the mean and of the variance
+    Mean = InitialAssetPrice*Sensitivity
+    Variance = Deviation**2
+    MeanDerivative = InitialAssetPrice*RiskFreeReturn*Growth**(IntervalsNumber-1)
+    VarianceDerivative = (Volatility**2*(Powers.sum()+RiskFreeReturn*DeltaTime*(2*Steps*Powers).sum()/Growth)/
+                          IntervalsNumber)
+    Rate = 0.5*VarianceDerivative/Variance
+    return np.array([[Sensitivity, 0],
+                     [-Sensitivity**2*Mean/Variance, Sensitivity**2/Variance],
+                     [-Mean/Volatility, 1/Volatility],
+                     [Rate*Mean-MeanDerivative, -Rate]]), PayoffWeights
+
+def computeGreekStatistics(PriceArray, Payoffs, StrikeArray, Coefficients, PayoffWeights):
+    """ Statistics of the Monte Carlo Greeks
+        This method computes the estimators of the Greeks of each sample
+        from the final prices of its paths, the mean of the two paths with
+        the antithetic variates, and sums them. The weights of the paths are
+        computed once and the estimators one strike and one Greek at a
+        time, so that only rows of the paths are kept in memory.
+
+        Parameters
+            PriceArray : the final prices of the paths, with the antithetic
+                      ones after the ones of the normals
+            Payoffs : the matrix of the undiscounted payoffs of the samples
+            StrikeArray : an array with all the strikes for the Call
+            Coefficients, PayoffWeights : the weights of computeGreekWeights
+
+        Returns
+            The matrix with the sum of the estimators of each Greek and of
+            their squares on the rows and one column for each strike
+    """
+    PriceArray = np.asarray(PriceArray, dtype=np.float64)
+    StrikeArray = np.asarray(StrikeArray, dtype=np.float64)
+    SamplesNumber = Payoffs.shape[1]
+    # The weights a+b*S of all the paths, with one row for each Greek
+    Weights = np.multiply.outer(Coefficients[:,1], PriceArray)
+    Weights += Coefficients[:,0:1]
+    InTheMoney = np.empty(len(PriceArray), dtype=bool)
+    Row = np.empty(len(PriceArray))
+    Square = np.empty(SamplesNumber)
+    Statistics = np.zeros(shape=(2*len(Coefficients),len(StrikeArray)))
+    for k, Strike in enumerate(StrikeArray):
+        np.greater(PriceArray, Strike, out=InTheMoney)
+        for Greek in range(len(Coefficients)):
+            np.multiply(Weights[Greek], InTheMoney, out=Row)
+            if len(PriceArray) > SamplesNumber:
+                Row[:SamplesNumber] += Row[SamplesNumber:]
+                Row[:SamplesNumber] *= 0.5
+            Samples = Row[:SamplesNumber]
+            if PayoffWeights[Greek]:
+                np.multiply(Payoffs[k], PayoffWeights[Greek], out=Square)
+                Samples += Square
+            Statistics[2*Greek,k] = Samples.sum()
+            Statistics[2*Greek+1,k] = np.square(Samples, out=Square).sum()
+    return Statistics
+
+def computeCallPayoffs(PriceArray, StrikeArray, BlockSize):
+    """ Call payoffs of the paths
+        This method computes the payoffs of the final prices for all the
+        strikes in a single matrix, without temporary matrices, and with
+        the antithetic variates the mean of the payoffs of the two paths of
+        each sample.
+
+        Parameters
+            PriceArray : the final prices of the paths, with the antithetic
+                      ones after the ones of the normals
+            StrikeArray : an array with all the strikes for the Call, of
+                      the data type of the prices
+            BlockSize : the number of samples in the block
+
+        Returns
+            The matrix of the undiscounted payoffs with dimensions
+            len(StrikeArray) x BlockSize
+    """
+    Payoffs = np.empty((len(StrikeArray),len(PriceArray)), dtype=PriceArray.dtype)
+    np.subtract(PriceArray[np.newaxis,:], StrikeArray[:,np.newaxis], out=Payoffs)
+    np.maximum(Payoffs, 0, out=Payoffs)
+    if len(PriceArray) > BlockSize:
+        Payoffs[:,:BlockSize] += Payoffs[:,BlockSize:]
+        Payoffs[:,:BlockSize] *= PriceArray.dtype.type(0.5)
+        Payoffs = Payoffs[:,:BlockSize]
+    return Payoffs
+
+def computeBlockPayoffs(DeltaTime, StrikeArray, IntervalsNumber, Start, BlockSize, InitialAssetPrice,
+                        RiskFreeReturn, Volatility, RandomSeed, VarianceReduction=None, Engine='euler',
+                        DataType='float64', Instrumentation=Quiet):
+    """ Payoffs of a block of paths
+        This method evolves a block of trajectories with the Euler scheme,
+        drawing the normal observations one time step at a time from the
+        random streams of its samples, so that only a single step is kept
+        in memory.
+        With the antithetic variates each normal drives two paths, with
+        opposite signs, and the sample is the mean of their payoffs. With
+        the control variate each normal also drives a geometric Brownian
+        motion with relative volatility Volatility/InitialAssetPrice,
+        whose expected payoff is known from the Black-Scholes formula.
+        With the Sobol normals the whole block is drawn from a scrambled
+        Sobol sequence, scrambled with the random seed.
+        With the terminal engine the final price of the Euler scheme, a
+        normal, is sampled exactly with a single step of amplitude
+        DeltaTime*IntervalsNumber, and the control variate evolves over
+        the same step.
+        With the float32 data type the normals are drawn in float32, that
+        is a different stream from the float64 one, and the paths and the
+        payoffs are evolved in float32.
+
+        Parameters
+            DeltaTime : the amplitude of a each time intervals
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            Start : the index of the first sample of the block
+            BlockSize : the number of samples in the block
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            RandomSeed : the integer entropy of the random streams
+            VarianceReduction : the variance reduction techniques
+            Engine : the path engine, 'euler' or 'terminal'
+            DataType : the floating point type of the paths, 'float64' or 'float32'
+            Instrumentation : the instrumentation that collects the time spent
+                      drawing the normals ('rng'), evolving the paths ('paths')
+                      and computing the payoffs ('payoffs')
+
+        Returns
+            The matrix of the undiscounted payoffs with dimensions
+            len(StrikeArray) x BlockSize, the matrix of the undiscounted
+            payoffs of the control, None without the control variate, and
+            the array of the final prices of the paths, all of the data type
+    """
+    Techniques = parseVarianceReduction(VarianceReduction)
+    DataType = checkDataType(DataType)
+    StrikeArray = np.asarray(StrikeArray, dtype=DataType)
+    Timed = Instrumentation.Enabled
+    RandomTime = PathsTime = 0.0
+    # The terminal engine is a single step with the growth and the deviation of the whole scheme
+    if checkEngine(Engine) == 'terminal':
+        Growth, Deviation = computeTerminalLaw(DeltaTime*IntervalsNumber, IntervalsNumber, RiskFreeReturn,
+                                               Volatility)
+        DeltaTime, IntervalsNumber = DeltaTime*IntervalsNumber, 1
+    else:
+        Growth, Deviation = 1+RiskFreeReturn*DeltaTime, Volatility*np.sqrt(DeltaTime)
+    Paths = 2*BlockSize if 'antithetic' in Techniques else BlockSize
+    # The scalars of the data type, so that they do not promote the paths to float64
+    Drift = DataType.type(Growth)
+    Diffusion = DataType.type(Deviation)
+    PriceArray = np.full(Paths, InitialAssetPrice, dtype=DataType)
+    NormalArray = np.empty(Paths, dtype=DataType)
+    # In float32 the factor 1+RiskFreeReturn*DeltaTime is rounded by up to 6e-8,
+    # a bias that grows with the steps, so the drift is added as S*(Growth-1)
+    Compensated = DataType != np.float64
+    if Compensated:
+        Rate = DataType.type(Growth-1)
+        DriftArray = np.empty(Paths, dtype=DataType)
+    if 'sobol' in Techniques:
+        with Instrumentation.stage('rng'):
+            NormalMatrix = generateSobolNormals(np.random.default_rng(np.random.SeedSequence(RandomSeed)),
+                                                BlockSize, IntervalsNumber, Start)
+    else:
+        Generators = createStreams(RandomSeed, Start, BlockSize)
+        Buffer = np.empty(StreamSize, dtype=DataType)
+    if 'control' in Techniques:
+        RelativeVolatility = Volatility/InitialAssetPrice
+        ControlDrift = DataType.type((RiskFreeReturn-0.5*RelativeVolatility**2)*DeltaTime)
+        ControlDiffusion = DataType.type(RelativeVolatility*np.sqrt(DeltaTime))
+        ControlArray = np.full(Paths, InitialAssetPrice, dtype=DataType)
+    for j in range(IntervalsNumber):
+        if Timed:
+            StepTime = perf_counter()
+        if 'sobol' in Techniques:
+            NormalArray[:] = NormalMatrix[:,j]
+        else:
+            drawStreamNormals(Generators, Start, NormalArray[:BlockSize], Buffer)
+        if Timed:
+            RandomTime -= StepTime; StepTime = perf_counter(); RandomTime += StepTime
+        if 'antithetic' in Techniques:
+            np.negative(NormalArray[:BlockSize], out=NormalArray[BlockSize:])
+        if 'control' in Techniques:
+            ControlArray *= np.exp(ControlDrift+ControlDiffusion*NormalArray)
+        if Compensated:
+            np.multiply(PriceArray, Rate, out=DriftArray)
+            NormalArray *= Diffusion
+            PriceArray += DriftArray
+            PriceArray += NormalArray
+        else:
+            PriceArray *= Drift
+            NormalArray *= Diffusion
+            PriceArray += NormalArray
+        if Timed:
+            PathsTime += perf_counter()-StepTime
+    if Timed:
+        Instrumentation.add('rng', RandomTime); Instrumentation.add('paths', PathsTime)
+        StepTime = perf_counter()
+    Payoffs = computeCallPayoffs(PriceArray, StrikeArray, BlockSize)
+    Controls = None
+    if 'control' in Techniques:
+        Controls = computeCallPayoffs(ControlArray, StrikeArray, BlockSize)
+    if Timed:
+        Instrumentation.add('payoffs', perf_counter()-StepTime)
+    return Payoffs, Controls, PriceArray
+
+def computeFusedStatistics(Time, StrikeArray, IntervalsNumber, Start, BlockSize, InitialAssetPrice,
+                           RiskFreeReturn, Volatility, RandomSeed, VarianceReduction=None, Engine='euler',
+                           Greeks=False):
+    """ Fused statistics of a block of paths
+        This method evolves the block of paths with the compiled kernel,
+        that draws the normals of each sample from a counter-based stream
+        keyed by the random seed and the index of the sample, so the paths
+        are not the ones of the numpy backend but they are reproducible
+        for any number of threads and any split in blocks. The paths are kept in registers, so the
+        kernel works in float64 whatever the data type.
+
+        Parameters
+            Time : the option expiration time
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            Start : the index of the first sample of the block
+            BlockSize : the number of samples in the block
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            RandomSeed : the integer entropy of the random streams
+            VarianceReduction : the variance reduction techniques, 'antithetic'
+                      and 'control'
+            Engine : the path engine, 'euler' or 'terminal'
+            Greeks : True to add the sums of the estimators of the Greeks
+
+        Returns
+            The matrix of the sums of the undiscounted payoffs, as the one
+            of computeBlockStatistics
+    """
+    Techniques = parseVarianceReduction(VarianceReduction)
+    if 'sobol' in Techniques:
+        raise ValueError("The Sobol normals are available only with the numpy backend")
+    Coefficients, PayoffWeights = computeGreekWeights(Time, IntervalsNumber, InitialAssetPrice, RiskFreeReturn,
+                                                      Volatility)
+    DeltaTime = Time/IntervalsNumber
+    if checkEngine(Engine) == 'terminal':
+        (Drift, Diffusion), DeltaTime, IntervalsNumber = computeTerminalLaw(Time, IntervalsNumber, RiskFreeReturn,
+                                                                            Volatility), Time, 1
+    else:
+        Drift, Diffusion = 1+RiskFreeReturn*DeltaTime, Volatility*np.sqrt(DeltaTime)
+    RelativeVolatility = Volatility/InitialAssetPrice
+    Key = np.random.SeedSequence(RandomSeed).generate_state(1, np.uint64)[0]
+    import kernel
+    return kernel.computeBlockStatistics(Key, np.asarray(StrikeArray, dtype=np.float64), IntervalsNumber,
+                                         Start, BlockSize, float(InitialAssetPrice), float(Drift),
+                                         float(Diffusion), 'antithetic' in Techniques,
+                                         float((RiskFreeReturn-0.5*RelativeVolatility**2)*DeltaTime),
+                                         float(RelativeVolatility*np.sqrt(DeltaTime)), 'control' in Techniques,
+                                         Greeks, Coefficients, PayoffWeights)
+
+def computeBlockStatistics(Time, StrikeArray, IntervalsNumber, Start, BlockSize, InitialAssetPrice,
+                           RiskFreeReturn, Volatility, RandomSeed, VarianceReduction=None, Engine='euler',
+                           DataType='float64', Backend='numpy', Greeks=False, Instrumentation=Quiet):
+    """ Statistics of a block of paths
+        This method evolves the block of the samples from the given index
+        for one expiration time. The normals of each sample are drawn from
+        the random stream that contains it, so they depend neither on the
+        split of the samples in blocks nor on where the block is computed.
+
+        Parameters
+            Time : the option expiration time
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            Start : the index of the first sample of the block
+            BlockSize : the number of samples in the block
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            RandomSeed : the integer entropy of the random streams
+            VarianceReduction : the variance reduction techniques
+            Engine : the path engine, 'euler' or 'terminal'
+            DataType : the floating point type of the paths
+            Backend : the backend of the paths, 'numpy' or 'numba'
+            Greeks : True to add the sums of the estimators of the Greeks
+            Instrumentation : the instrumentation that collects the timings
+
+        Returns
+            The float64 matrix of the sums of the undiscounted payoffs with one column
+            for each strike and, on the rows, the number of samples, the sum
+            of the payoffs and of their squares, the sum of the control
+            payoffs and of their squares and the sum of the products of the
+            payoffs with the control payoffs, followed with the Greeks by the
+            sum of the estimators of each Greek and of their squares. The
+            statistics of different blocks can be added together
+    """
+    if Backend == 'numba':
+        with Instrumentation.stage('paths'):
+            return computeFusedStatistics(Time, StrikeArray, IntervalsNumber, Start, BlockSize, InitialAssetPrice,
+                                          RiskFreeReturn, Volatility, RandomSeed, VarianceReduction, Engine, Greeks)
+    Payoffs, Controls, PriceArray = computeBlockPayoffs(Time/IntervalsNumber, StrikeArray, IntervalsNumber, Start,
+                                                        BlockSize, InitialAssetPrice, RiskFreeReturn, Volatility,
+                                                        RandomSeed, VarianceReduction, Engine, DataType,
+                                                        Instrumentation)
+    with Instrumentation.stage('payoffs'):
+        Statistics = createStatistics(len(StrikeArray), Greeks)
+        if Greeks:
+            Statistics[6:,:] = computeGreekStatistics(PriceArray, Payoffs, StrikeArray,
+                                                      *computeGreekWeights(Time, IntervalsNumber, InitialAssetPrice,
+                                                                           RiskFreeReturn, Volatility))
+        Statistics[0,:] = BlockSize
+        Statistics[1,:] = Payoffs.sum(axis=1, dtype=np.float64)
+        if Controls is not None:
+            Statistics[3,:] = Controls.sum(axis=1, dtype=np.float64)
+        # The squares one strike at a time, so that they need a single row of memory
+        for k in range(len(StrikeArray)):
+            Statistics[2,k] = np.square(Payoffs[k]).sum(dtype=np.float64)
+            if Controls is not None:
+                Statistics[4,k] = np.square(Controls[k]).sum(dtype=np.float64)
+                Statistics[5,k] = (Payoffs[k]*Controls[k]).sum(dtype=np.float64)
+    return Statistics
+
+def createStatistics(StrikesNumber, Greeks=False):
+    """ Empty statistics
+        This method creates the statistics of no samples, to which the
+        ones of the blocks are added.
+
+        Parameters
+            StrikesNumber : the number of strikes
+            Greeks : True for the statistics with the Greeks
+
+        Returns
+            The matrix of zeros of computeBlockStatistics
+    """
+    return np.zeros(shape=(6+2*len(GreekNames) if Greeks else 6,StrikesNumber))
+
+def estimatePrices(Statistics, AttualizationFactor, ControlMean=None):
+    """ Prices and standard errors
+        This method computes the Monte Carlo estimation of the prices and
+        its standard error from the statistics of the payoffs. With the
+        control variate the mean of the payoffs is corrected with the
+        optimal multiple of the difference between the mean of the control
+        payoffs and their known expectation value.
+
+        Parameters
+            Statistics : the statistics of the payoffs of computeBlockStatistics
+            AttualizationFactor : the factor that has to applied to the payoff to obtain the price
+            ControlMean : the expectation value of the undiscounted control
+                          payoffs, None without the control variate
+
+        Returns
+            The array of the prices and the array of their standard errors
+    """
+    Number, PayoffSum, PayoffSquares, ControlSum, ControlSquares, ProductSum = Statistics[:6]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Mean = PayoffSum/Number
+        Variance = (PayoffSquares-Number*Mean**2)/(Number-1)
+        if ControlMean is not None:
+            ControlAverage = ControlSum/Number
+            ControlVariance = (ControlSquares-Number*ControlAverage**2)/(Number-1)
+            Covariance = (ProductSum-Number*Mean*ControlAverage)/(Number-1)
+            Beta = np.where(ControlVariance > 0, Covariance/ControlVariance, 0)
+            Mean = Mean-Beta*(ControlAverage-ControlMean)
+            Variance = Variance-Beta*Covariance
+        Error = np.sqrt(np.maximum(Variance,0)/Number)
+    return Mean*AttualizationFactor, Error*AttualizationFactor
+
+def estimateGreeks(Statistics, AttualizationFactor):
+    """ Greeks and standard errors
+        This method computes the Monte Carlo estimation of the Greeks and
+        its standard error from the statistics of their estimators.
+
+        Parameters
+            Statistics : the statistics of computeBlockStatistics with the Greeks
+            AttualizationFactor : the factor that has to applied to the payoff to obtain the price
+
+        Returns
+            The matrix of the Greeks, with one row for each of GreekNames,
+            and the matrix of their standard errors
+    """
+    Number = Statistics[0]
+    Sums, Squares = Statistics[6::2], Statistics[7::2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Mean = Sums/Number
+        Variance = (Squares-Number*Mean**2)/(Number-1)
+        Error = np.sqrt(np.maximum(Variance,0)/Number)
+    return Mean*AttualizationFactor, Error*AttualizationFactor
+
+def splitBlocks(SimulationNumbers, BlockSize=None):
+    """ Blocks of paths
+        This method splits the simulations in blocks of paths.
+
+        Parameters
+            SimulationNumbers : the number of montecarlo simulations
+            BlockSize : the number of paths of each block, None for a single block
+
+        Returns
+            The list of the index of the first sample and of the size of each block
+    """
+    if BlockSize is None:
+        BlockSize = SimulationNumbers
+    return [(Start, min(BlockSize, SimulationNumbers-Start)) for Start in range(0, SimulationNumbers, BlockSize)]
+
+def computeControlMean(Time, StrikeArray, InitialAssetPrice, RiskFreeReturn, Volatility, VarianceReduction=None):
+    """ Expectation value of the control payoffs
+        This method computes with the Black-Scholes formula the expected
+        undiscounted payoff of the geometric Brownian motion used as
+        control variate.
+
+        Parameters
+            Time : the option expiration time
+            StrikeArray : an array with all the strikes for the Call
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            VarianceReduction : the variance reduction techniques
+
+        Returns
+            The array of the expectation values, None without the control variate
+    """
+    if 'control' not in parseVarianceReduction(VarianceReduction):
+        return None
+    RelativeVolatility = Volatility/InitialAssetPrice
+    return (blackScholesCallPrice(InitialAssetPrice, np.asarray(StrikeArray, dtype=float), Time, RiskFreeReturn,
+                                  RelativeVolatility)*np.exp(RiskFreeReturn*Time))
+
+def computeStreamedPrices(Time, StrikeArray, IntervalsNumber, SimulationNumbers, InitialAssetPrice,
+                          RiskFreeReturn, Volatility, RandomSeed, BlockSize=None, VarianceReduction=None,
+                          Engine='euler', DataType='float64', Backend='numpy', Greeks=False,
+                          Instrumentation=Quiet):
+    """ Streamed Call prices for one expiration time
+        This method splits the simulations in blocks of paths and prices
+        all the strikes for one expiration time. Each sample draws its
+        normals from its random stream, spawned from the random seed, so the
+        same seed always gives the same prices for any block size and
+        different expiration times share the same random numbers.
+
+        Parameters
+            Time : the option expiration time
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            SimulationNumbers : the number of montecarlo samples
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            RandomSeed : the integer entropy of the random streams
+            BlockSize : the number of samples of each block, None for a single block
+            VarianceReduction : the variance reduction techniques
+            Engine : the path engine, 'euler' or 'terminal'
+            DataType : the floating point type of the paths
+            Backend : the backend of the paths, 'numpy' or 'numba'
+            Greeks : True to estimate the Greeks from the same paths
+            Instrumentation : the instrumentation that collects the timings
+
+        Returns
+            An array with the expectation value of the Call price for each
+            strike and the array of their standard errors, followed with the
+            Greeks by the matrix of the Greeks and the one of their standard
+            errors of estimateGreeks
+    """
+    Statistics = createStatistics(len(StrikeArray), Greeks)
+    for Start, Size in splitBlocks(SimulationNumbers, BlockSize):
+        Statistics += computeBlockStatistics(Time, StrikeArray, IntervalsNumber, Start, Size, InitialAssetPrice,
+                                             RiskFreeReturn, Volatility, RandomSeed, VarianceReduction, Engine,
+                                             DataType, Backend, Greeks, Instrumentation)
+    Prices = estimatePrices(Statistics, np.exp(-RiskFreeReturn*Time),
+                            computeControlMean(Time, StrikeArray, InitialAssetPrice, RiskFreeReturn, Volatility,
+                                               VarianceReduction))
+    if Greeks:
+        return Prices+estimateGreeks(Statistics, np.exp(-RiskFreeReturn*Time))
+    return Prices
+
+def computeAdaptivePrices(Time, StrikeArray, IntervalsNumber, BatchSize, MaxSamples, InitialAssetPrice,
+                          RiskFreeReturn, Volatility, RandomSeed, TargetError, RelativeError=False,
+                          VarianceReduction=None, Engine='euler', DataType='float64', Backend='numpy',
+                          Greeks=False, BlockSize=None, Instrumentation=Quiet):
+    """ Adaptive Call prices for one expiration time
+        This method simulates batches of paths for one expiration time until
+        the standard errors of all the strikes are below the target or the
+        budget of samples is reached. The batches draw from the same random
+        streams of computeStreamedPrices, so stopping after some batches
+        gives the same prices of a run with that number of samples. Each
+        batch is split in blocks to respect the memory ceiling, that does
+        not change the prices.
+
+        Parameters
+            Time : the option expiration time
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of intervals for the Euler method
+            BatchSize : the number of samples of each batch
+            MaxSamples : the budget of samples
+            InitialAssetPrice : the initial price of the underlying asset
+            RiskFreeReturn : the risk-free return refered to the bank account
+            Volatility : the volatility of the underlying asset
+            RandomSeed : the integer entropy of the random streams
+            TargetError : the target standard error of the prices
+            RelativeError : True if the target is relative to the prices
+            VarianceReduction : the variance reduction techniques
+            Engine : the path engine, 'euler' or 'terminal'
+            DataType : the floating point type of the paths
+            Backend : the backend of the paths, 'numpy' or 'numba'
+            Greeks : True to estimate the Greeks from the same paths, the
+                      target error is the one of the prices
+            BlockSize : the number of samples of each block, None for a
+                      single block for each batch
+            Instrumentation : the instrumentation that collects the timings
+
+        Returns
+            An array with the expectation value of the Call price for each
+            strike, the array of their standard errors and the number of
+            samples that have been simulated, followed with the Greeks by
+            the matrix of the Greeks and the one of their standard errors
+    """
+    AttualizationFactor = np.exp(-RiskFreeReturn*Time)
+    ControlMean = computeControlMean(Time, StrikeArray, InitialAssetPrice, RiskFreeReturn, Volatility,
+                                     VarianceReduction)
+    Statistics = createStatistics(len(StrikeArray), Greeks)
+    for Batch, Samples in splitBlocks(MaxSamples, BatchSize):
+        for Start, Size in splitBlocks(Samples, BlockSize):
+            Statistics += computeBlockStatistics(Time, StrikeArray, IntervalsNumber, Batch+Start, Size,
+                                                 InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed,
+                                                 VarianceReduction, Engine, DataType, Backend, Greeks,
+                                                 Instrumentation)
+        Prices, Errors = estimatePrices(Statistics, AttualizationFactor, ControlMean)
+        Tolerance = TargetError*np.abs(Prices) if RelativeError else TargetError
+        if Statistics[0,0] > 1 and (Errors <= Tolerance).all():
+            break
+    if Greeks:
+        return (Prices, Errors, int(Statistics[0,0]))+estimateGreeks(Statistics, AttualizationFactor)
+    return Prices, Errors, int(Statistics[0,0])
+
+def submitTask(Executor, Instrumentation, Function, *Arguments):
+    """ Submit a task
+        This method submits the function to the process pool, wrapped with
+        runInstrumented when the instrumentation is collecting the timings.
+
+        Parameters
+            Executor : the process pool
+            Instrumentation : the instrumentation of the pipeline
+            Function : the function of the task
+            Arguments : the positional arguments of the function
+
+        Returns
+            The future of the task
+    """
+    if Instrumentation.Enabled:
+        return Executor.submit(runInstrumented, Function, *Arguments)
+    return Executor.submit(Function, *Arguments)
+
+def collectTask(Future, Instrumentation):
+    """ Collect a task
+        This method waits for the result of a task submitted with submitTask
+        and merges the timings of the worker into the instrumentation.
+
+        Parameters
+            Future : the future of the task
+            Instrumentation : the instrumentation of the pipeline
+
+        Returns
+            The result of the function of the task
+    """
+    Result = Future.result()
+    if Instrumentation.Enabled:
+        Result, Timings = Result
+        Instrumentation.merge(Timings)
+    return Result
+
+def mapPreviousSurface(PreviousSurface, TimesArray, StrikeArray, WholeRows=False):
+    """ Cells of a previous surface
+        This method finds the cells of the grid that have been already
+        computed in a previous surface, that are the ones whose expiration
+        time and strike are both, exactly, in the previous grid.
+
+        Parameters
+            PreviousSurface : the dictionary of the previous surface, with
+                      its TimesArray and StrikeArray
+            TimesArray : an array with all the expiration times of the grid
+            StrikeArray : an array with all the strikes of the grid
+            WholeRows : True to reuse only the rows whose strikes have all
+                      been computed, as the adaptive rows whose stopping
+                      depends on all the strikes
+
+        Returns
+            The matrix of the flags of the reused cells and the indices of
+            the previous matrices that give their values
+    """
+    PreviousTimes = {Time: i for i, Time in enumerate(np.asarray(PreviousSurface['TimesArray']).tolist())}
+    PreviousStrikes = {Strike: j for j, Strike in enumerate(np.asarray(PreviousSurface['StrikeArray']).tolist())}
+    RowIndex = np.array([PreviousTimes.get(Time, -1) for Time in np.asarray(TimesArray).tolist()], dtype=int)
+    ColumnIndex = np.array([PreviousStrikes.get(Strike, -1) for Strike in np.asarray(StrikeArray).tolist()],
+                           dtype=int)
+    ReusedMatrix = (RowIndex >= 0)[:,np.newaxis] & (ColumnIndex >= 0)[np.newaxis,:]
+    if WholeRows:
+        ReusedMatrix[~ReusedMatrix.all(axis=1),:] = False
+    return ReusedMatrix, np.ix_(RowIndex, ColumnIndex)
+
+def storeRow(Surface, Row, Columns, Prices, Errors, Greeks=None, GreekErrors=None):
+    """ Store a row of the surface
+        This method copies the prices of the new strikes of a row, and
+        their Greeks, into the matrices of the surface.
+
+        Parameters
+            Surface : the dictionary of the matrices
+            Row : the index of the row
+            Columns : the indices of the columns of the new strikes
+            Prices, Errors : the arrays of the prices and of their standard errors
+            Greeks, GreekErrors : the matrices of the Greeks and of their
+                      standard errors of estimateGreeks, None without the Greeks
+    """
+    Surface['PricesMatrix'][Row,Columns], Surface['ErrorsMatrix'][Row,Columns] = Prices, Errors
+    if Greeks is not None:
+        for Greek, Name in enumerate(GreekNames):
+            Surface[Name + 'Matrix'][Row,Columns] = Greeks[Greek]
+            Surface[Name + 'ErrorsMatrix'][Row,Columns] = GreekErrors[Greek]
+
+def generatePricesSurface(TimesArray, StrikeArray, IntervalsNumber,
+                          SimulationNumbers, InitialAssetPrice, RiskFreeReturn,
+                          Volatility, RandomSeed=None, MaxMemory=None, Workers=None,
+                          VarianceReduction=None, TargetError=None, RelativeError=False,
+                          MaxSimulationNumbers=None, Engine='euler', Instrumentation=Quiet,
+                          PreviousSurface=None, DataType='float64', Backend='numpy', Greeks=False):
+    """ Call prices surface
+        This method implement the Monte Carlo and Euler methods to compute
+        the expectation value of all the prices of a call option by varying
+        the expiration time and the strike, together with the standard
+        error of each price. For each expiration time the trajectories are
+        evolved once and priced for all the strikes, with the normals
+        streamed one time step at a time.
+        With more than one worker each block of paths of each expiration
+        time is evolved in a process pool. Since the random streams belong
+        to the samples and the statistics are reduced in the same order,
+        the prices do not depend on the number of workers.
+        With a target error the paths of each expiration time are simulated
+        in batches of SimulationNumbers paths, until the standard errors of
+        all the strikes are below the target or MaxSimulationNumbers paths
+        have been simulated; in parallel each expiration time is a task.
+        With a previous surface computed with the same settings only the
+        new cells of the grid are simulated. All the expiration times use
+        the same random streams and each strike is priced on its own, so
+        the result is the one of a full rebuild. With a target error the
+        stopping of a row depends on all its strikes, so the rows with
+        new strikes are simulated again entirely.
+
+        Parameters
+            TimesArray : an array with all the possible expiration times
+            StrikeArray : an array with all the possible strike
+            IntervalsNumber : the number of interval in which the trajectory
+                      of the underlying asset has been divided to
+                      implement the Euler scheme
+            SimulationNumbers : the number of montecarlo simulations, or of
+                      each batch with a target error. With the antithetic
+                      variates each sample is made of two paths, so half of
+                      the samples are drawn
+            InitialAssetPrice : the initial value of the asset
+            RiskFreeReturn : the value of the risk-free return
+            Volatility : the value of the fixed volatility of the asset
+            RandomSeed : the random seed, None to draw it from the global
+                      numpy.random state, so that np.random.seed gives
+                      reproducible prices
+            MaxMemory : the memory ceiling of the paths in megabytes,
+                      None for no ceiling. The paths are split in blocks
+                      to respect it, and the prices do not depend on it
+            Workers : the number of worker processes, None or 1 to run
+                      in the current process
+            VarianceReduction : the variance reduction techniques among
+                      'antithetic', 'control' and 'sobol', as a comma
+                      separated string. The standard errors of the Sobol
+                      normals are the ones of independent samples, an
+                      upper bound of the actual errors
+            TargetError : the target standard error of the prices, None
+                      to simulate exactly SimulationNumbers paths
+            RelativeError : True if the target error is relative to the prices
+            MaxSimulationNumbers : the budget of paths for each expiration
+                      time with a target error, by default 100 batches
+            Engine : the path engine, 'euler' for the Euler scheme of the
+                      arithmetic dynamics, 'terminal' for the exact sampling
+                      of the final price of the Euler scheme, with one
+                      normal for each path
+            Instrumentation : the instrumentation that collects the timings
+                      of the stages, also from the workers, and records the
+                      progress of each row
+            PreviousSurface : the dictionary returned by a previous call
+                      with the same settings and another grid, None to
+                      compute all the cells. It is ignored, with a warning,
+                      when it has no Greeks and they are requested
+            DataType : the floating point type of the paths and of the
+                      payoffs, 'float64' or 'float32' with the sums in float64
+            Backend : the backend of the paths, 'numpy' or 'numba' for the
+                      compiled kernel, that has its own random streams and
+                      does not support the Sobol normals
+            Greeks : True to estimate the delta, gamma, vega and theta of
+                      each cell from the same paths of its price, with the
+                      estimators of computeGreekWeights. The prices do not
+                      change and the Greeks do not use the control variate
+
+        Returns
+            The dictionary with the PricesMatrix matrix with all the computed
+            prices, the ErrorsMatrix matrix with their standard errors, the
+            PathsMatrix matrix with the number of simulated paths, the
+            ReusedMatrix matrix with the flags of the cells taken from the
+            previous surface and the TimesArray and StrikeArray of the grid.
+            With the Greeks also the DeltaMatrix, GammaMatrix, VegaMatrix and
+            ThetaMatrix matrices and the matrices of their standard errors,
+            as DeltaErrorsMatrix
+    """
+    TimesArray, StrikeArray = np.asarray(TimesArray, dtype=float), np.asarray(StrikeArray, dtype=float)
+    if RandomSeed is None:
+        RandomSeed = int(np.random.randint(2**63, dtype=np.uint64))
+    RandomSeed = np.random.SeedSequence(RandomSeed).entropy
+    Techniques = parseVarianceReduction(VarianceReduction)
+    Engine = checkEngine(Engine)
+    Backend = checkBackend(Backend)
+    DataType = checkDataType(DataType, Backend).name
+    if Backend == 'numba' and 'sobol' in Techniques:
+        raise ValueError("The Sobol normals are available only with the numpy backend")
+    PathsPerSample = 2 if 'antithetic' in Techniques else 1
+    SamplesNumber = max(1, SimulationNumbers//PathsPerSample)
+    StepsNumber = 1 if Engine == 'terminal' else IntervalsNumber
+    BlockSize = computeBlockSize(MaxMemory, len(StrikeArray), StepsNumber, Techniques, DataType, Greeks)
+    ReusedMatrix = np.zeros((len(TimesArray),len(StrikeArray)), dtype=bool)
+    if PreviousSurface is not None:
+        if Greeks and 'DeltaMatrix' not in PreviousSurface:
+            warnings.warn('The previous surface has no Greeks, all the cells are computed again')
+        else:
+            ReusedMatrix, Cells = mapPreviousSurface(PreviousSurface, TimesArray, StrikeArray, TargetError is not None)
+    # The rows to compute, with the columns of their new strikes
+    Rows = [(i, np.flatnonzero(~ReusedMatrix[i,:])) for i in range(len(TimesArray)) if not ReusedMatrix[i,:].all()]
+    if TargetError is not None:
+        BatchSize = SamplesNumber
+        if MaxSimulationNumbers is None:
+            MaxSimulationNumbers = 100*SimulationNumbers
+        SamplesNumber = max(1, MaxSimulationNumbers//PathsPerSample)
+        Arguments = [(TimesArray[i], StrikeArray[Columns], IntervalsNumber, BatchSize, SamplesNumber,
+                      InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, TargetError, RelativeError,
+                      Techniques, Engine, DataType, Backend, Greeks, BlockSize)
+                     for i, Columns in Rows]
+    else:
+        Arguments = [(TimesArray[i], StrikeArray[Columns], IntervalsNumber, SamplesNumber, InitialAssetPrice,
+                      RiskFreeReturn, Volatility, RandomSeed, BlockSize, Techniques, Engine, DataType, Backend,
+                      Greeks)
+                     for i, Columns in Rows]
+    Names = ('PricesMatrix', 'ErrorsMatrix')
+    if Greeks:
+        Names += tuple(Greek + 'Matrix' for Greek in GreekNames)+tuple(Greek + 'ErrorsMatrix' for Greek in GreekNames)
+    Surface = {Name: np.zeros(shape=(len(TimesArray),len(StrikeArray))) for Name in Names}
+    Surface['PathsMatrix'] = np.full((len(TimesArray),len(StrikeArray)), SamplesNumber*PathsPerSample)
+    if ReusedMatrix.any():
+        for Name in Names+('PathsMatrix',):
+            Surface[Name][ReusedMatrix] = np.asarray(PreviousSurface[Name])[Cells][ReusedMatrix]
+    if Workers is not None and Workers > 1:
+        with ProcessPoolExecutor(max_workers=Workers) as Executor:
+            if TargetError is not None:
+                Futures = [submitTask(Executor, Instrumentation, computeAdaptivePrices, *Argument)
+                           for Argument in Arguments]
+            else:
+                Futures = [[submitTask(Executor, Instrumentation, computeBlockStatistics, TimesArray[i],
+                                       StrikeArray[Columns], IntervalsNumber, Start, Size, InitialAssetPrice,
+                                       RiskFreeReturn, Volatility, RandomSeed, Techniques, Engine, DataType,
+                                       Backend, Greeks)
+                            for Start, Size in splitBlocks(SamplesNumber, BlockSize)]
+                           for i, Columns in Rows]
+            for Row, (i, Columns) in enumerate(Rows):
+                if TargetError is not None:
+                    Results = collectTask(Futures[Row], Instrumentation)
+                    Surface['PathsMatrix'][i,Columns] = Results[2]*PathsPerSample
+                    storeRow(Surface, i, Columns, *Results[:2], *Results[3:])
+                else:
+                    Statistics = sum(collectTask(Future, Instrumentation) for Future in Futures[Row])
+                    Results = estimatePrices(Statistics, np.exp(-RiskFreeReturn*TimesArray[i]),
+                                             computeControlMean(TimesArray[i], StrikeArray[Columns],
+                                                                InitialAssetPrice, RiskFreeReturn, Volatility,
+                                                                Techniques))
+                    if Greeks:
+                        Results += estimateGreeks(Statistics, np.exp(-RiskFreeReturn*TimesArray[i]))
+                    storeRow(Surface, i, Columns, *Results)
+                Instrumentation.record('row', row=i, time=float(TimesArray[i]),
+                                       paths=int(Surface['PathsMatrix'][i,Columns[0]]), strikes=len(Columns))
+    else:
+        for Row, (i, Columns) in enumerate(Rows):
+            if TargetError is not None:
+                Results = computeAdaptivePrices(*Arguments[Row], Instrumentation=Instrumentation)
+                Surface['PathsMatrix'][i,Columns] = Results[2]*PathsPerSample
+                storeRow(Surface, i, Columns, *Results[:2], *Results[3:])
+            else:
+                storeRow(Surface, i, Columns, *computeStreamedPrices(*Arguments[Row],
+                                                                     Instrumentation=Instrumentation))
+            Instrumentation.record('row', row=i, time=float(TimesArray[i]),
+                                   paths=int(Surface['PathsMatrix'][i,Columns[0]]), strikes=len(Columns))
+    Surface.update({'ReusedMatrix': ReusedMatrix, 'TimesArray': TimesArray, 'StrikeArray': StrikeArray})
+    return Surface
+
 def generatePricesMatrix(TimesArray, StrikeArray, IntervalsNumber,
                          SimulationNumbers, InitialAssetPrice, RiskFreeReturn,
-                         Volatility):
+                         Volatility, RandomSeed=None, MaxMemory=None, Workers=None,
+                         VarianceReduction=None, Engine='euler', DataType='float64', Backend='numpy'):
     """ Call prices matrix
         This method implement the Monte Carlo and Euler methods to compute
         the expectation value of all the prices of a call option by varying
-        the expiration time and the strike.
+        the expiration time and the strike, as generatePricesSurface.
 
         Parameters
             TimesArray : an array with all the possible expiration times
@@ -50,30 +1147,64 @@ def generatePricesMatrix(TimesArray, StrikeArray, IntervalsNumber,
             InitialAssetPrice : the initial value of the asset
             RiskFreeReturn : the value of the risk-free return
             Volatility : the value of the fixed volatility of the asset
+            RandomSeed : the random seed, None to draw it from the global
+                      numpy.random state
+            MaxMemory : the memory ceiling of the paths in megabytes,
+                      None for no ceiling
+            Workers : the number of worker processes, None or 1 to run
+                      in the current process
+            VarianceReduction : the variance reduction techniques
+            Engine : the path engine, 'euler' or 'terminal'
+            DataType : the floating point type of the paths, 'float64' or 'float32'
+            Backend : the backend of the paths, 'numpy' or 'numba'
 
         Returns
             The PricesMatrix matrix with all the computed prices
     """
-    InitialTime = datetime.now()
-    PricesMatrix = np.zeros(shape=(len(TimesArray),len(StrikeArray)))
-    NormalMatrix = stats.norm.rvs(size=(IntervalsNumber,SimulationNumbers))
-    print('Normal Generated! Time: ', datetime.now()-InitialTime)
-    for i in range(len(TimesArray)):
-        T = TimesArray[i]; DeltaTime = T/IntervalsNumber; AttualizationFactor=np.exp(-RiskFreeReturn*T)
-        for g in range(len(StrikeArray)):
-            PricesMatrix[i,g] = computeSinglePrice(DeltaTime, StrikeArray[g], IntervalsNumber, SimulationNumbers,
-                                                   InitialAssetPrice, RiskFreeReturn, Volatility, AttualizationFactor,
-                                                   NormalMatrix)
-            PassedTime = datetime.now() - InitialTime
-            print('Done element in position [', i, ']','[',g,']', 'Time: ', PassedTime)
-    return PricesMatrix
+    return generatePricesSurface(TimesArray, StrikeArray, IntervalsNumber, SimulationNumbers, InitialAssetPrice,
+                                 RiskFreeReturn, Volatility, RandomSeed, MaxMemory, Workers,
+                                 VarianceReduction, Engine=Engine, DataType=DataType,
+                                 Backend=Backend)['PricesMatrix']
+
+
+def normalCdf(x):
+    """ Standard normal cumulative distribution
+        This method computes the cumulative distribution function of the
+        standard normal with the complementary error function, element-wise
+        and without the overhead of the scipy.stats distributions.
+
+        Parameters
+            x : the array of points
+
+        Returns
+            The array of the values of the cumulative distribution
+    """
+    # Imported here, so that scipy is loaded only when the formulas are used
+    from scipy import special
+    return 0.5*special.erfc(-np.asarray(x)/np.sqrt(2))
+
+
+def normalPdf(x):
+    """ Standard normal density
+        This method computes the density function of the standard normal
+        element-wise.
+
+        Parameters
+            x : the array of points
+
+        Returns
+            The array of the values of the density
+    """
+    return np.exp(-0.5*np.square(x))/np.sqrt(2*np.pi)
 
 
 def blackScholesCallPrice(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volatility):
     """ Call price Blcak-Scholes
         This method implements the Black-Scholes formula
         to compute the price of a call option given the strike,
-        the expiration time, the risk-free return and the volatility
+        the expiration time, the risk-free return and the volatility.
+        All the parameters can be broadcastable arrays and the prices
+        that are not defined, like the ones with a zero time, are set to 0.
 
         Parameters
             InitialAssetPrice : the initial value of the assets
@@ -83,17 +1214,15 @@ def blackScholesCallPrice(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volat
             Volatility : the volatility of the asset
 
         Returns
-            The price of the call option
+            The price of the call option, or the array of prices
     """
-    CallPrice = 0
-    with np.errstate(divide='ignore', invalid='ignore'):
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        SqrtTime = np.sqrt(Time)
         d1 = np.nan_to_num(np.divide((np.log(np.divide(InitialAssetPrice,Strike)) +
-             (RiskFreeReturn + 0.5*Volatility**2)*Time),(Volatility*np.sqrt(Time))))
-        d2 = d1 - Volatility * np.sqrt(Time)
-        CallPrice = InitialAssetPrice * stats.norm.cdf(d1) - np.exp(-RiskFreeReturn * Time) * Strike * stats.norm.cdf(d2)
-        if np.isnan(CallPrice):
-            return 0.0
-    return CallPrice
+             (RiskFreeReturn + 0.5*np.square(Volatility))*Time),(Volatility*SqrtTime)))
+        d2 = d1 - Volatility * SqrtTime
+        CallPrice = InitialAssetPrice * normalCdf(d1) - np.exp(-RiskFreeReturn * Time) * Strike * normalCdf(d2)
+    return np.where(np.isnan(CallPrice), 0.0, CallPrice)[()]
 
 
 def blackScholesVegaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volatility):
@@ -101,7 +1230,8 @@ def blackScholesVegaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volat
         This method implements the formula to compute the greek
         vega, that is the derivative of the Black-Scholes
         formula with respect to the price, utilized in the find_vol
-        function.
+        function. All the parameters can be broadcastable arrays and
+        the values that are not defined are set to 0.
 
         Parameters
             InitialAssetPrice : the initial value of the assets
@@ -111,20 +1241,102 @@ def blackScholesVegaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volat
             Volatility : the volatility of the asset
 
         Returns
-            The value of the Vega greek derivative
+            The value of the Vega greek derivative, or the array of values
     """
-    VegaGreek = 0
-    with np.errstate(divide='ignore', invalid='ignore'):
-        d1 = np.divide((np.log(InitialAssetPrice / Strike) +
-            (RiskFreeReturn + 0.5 * Volatility ** 2) * Time),(Volatility * np.sqrt(Time)))
-        VegaGreek = InitialAssetPrice * stats.norm.pdf(d1) * np.sqrt(Time)
-    return VegaGreek
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        SqrtTime = np.sqrt(Time)
+        d1 = np.divide((np.log(np.divide(InitialAssetPrice, Strike)) +
+            (RiskFreeReturn + 0.5 * np.square(Volatility)) * Time),(Volatility * SqrtTime))
+        VegaGreek = InitialAssetPrice * normalPdf(d1) * SqrtTime
+    return np.where(np.isnan(VegaGreek), 0.0, VegaGreek)[()]
+
+
+def blackScholesDeltaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volatility):
+    """ Compute value Delta greek
+        This method implements the formula to compute the greek
+        delta, that is the derivative of the Black-Scholes formula
+        with respect to the initial value of the asset. All the
+        parameters can be broadcastable arrays and the values that
+        are not defined are set to 0.
+
+        Parameters
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strike of the option
+            Time : the option expiration time
+            RiskFreeReturn : the risk-free return
+            Volatility : the volatility of the asset
+
+        Returns
+            The value of the Delta greek derivative, or the array of values
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        SqrtTime = np.sqrt(Time)
+        d1 = np.divide((np.log(np.divide(InitialAssetPrice, Strike)) +
+            (RiskFreeReturn + 0.5 * np.square(Volatility)) * Time),(Volatility * SqrtTime))
+        DeltaGreek = normalCdf(d1)
+    return np.where(np.isnan(DeltaGreek), 0.0, DeltaGreek)[()]
+
+
+def blackScholesGammaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volatility):
+    """ Compute value Gamma greek
+        This method implements the formula to compute the greek
+        gamma, that is the second derivative of the Black-Scholes
+        formula with respect to the initial value of the asset. All
+        the parameters can be broadcastable arrays and the values
+        that are not defined are set to 0.
+
+        Parameters
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strike of the option
+            Time : the option expiration time
+            RiskFreeReturn : the risk-free return
+            Volatility : the volatility of the asset
+
+        Returns
+            The value of the Gamma greek derivative, or the array of values
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        SqrtTime = np.sqrt(Time)
+        d1 = np.divide((np.log(np.divide(InitialAssetPrice, Strike)) +
+            (RiskFreeReturn + 0.5 * np.square(Volatility)) * Time),(Volatility * SqrtTime))
+        GammaGreek = normalPdf(d1) / (InitialAssetPrice * Volatility * SqrtTime)
+    return np.where(np.isnan(GammaGreek), 0.0, GammaGreek)[()]
+
+
+def blackScholesThetaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, Volatility):
+    """ Compute value Theta greek
+        This method implements the formula to compute the greek
+        theta, that is the derivative of the Black-Scholes formula
+        with respect to the calendar time, minus the one with respect
+        to the expiration time, per year. All the parameters can be
+        broadcastable arrays and the values that are not defined are
+        set to 0.
+
+        Parameters
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strike of the option
+            Time : the option expiration time
+            RiskFreeReturn : the risk-free return
+            Volatility : the volatility of the asset
+
+        Returns
+            The value of the Theta greek derivative, or the array of values
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        SqrtTime = np.sqrt(Time)
+        d1 = np.divide((np.log(np.divide(InitialAssetPrice, Strike)) +
+            (RiskFreeReturn + 0.5 * np.square(Volatility)) * Time),(Volatility * SqrtTime))
+        d2 = d1 - Volatility * SqrtTime
+        ThetaGreek = (-InitialAssetPrice * normalPdf(d1) * Volatility / (2 * SqrtTime) -
+                      RiskFreeReturn * Strike * np.exp(-RiskFreeReturn * Time) * normalCdf(d2))
+    return np.where(np.isnan(ThetaGreek), 0.0, ThetaGreek)[()]
 
 
 def findImpliedVolatility(TargetValue, InitialAssetPrice, Strike, Time, RiskFreeReturn, MaxIteration, Precision):
     """ Implied volatility Newton-Raphson
-        This method implements the Newton-Raphson method to
-        compute the implied volatility for the input price.
+        This method implements the safeguarded Newton-Raphson method of
+        findImpliedVolatilities to compute the implied volatility for
+        the input price.
 
         Parameters
             TargetValue : the price of which we want to compute
@@ -137,15 +1349,233 @@ def findImpliedVolatility(TargetValue, InitialAssetPrice, Strike, Time, RiskFree
             Precision : the precision respect to the target value
 
         Returns
-            The value of the implied volatility for that time and strike
+            The value of the implied volatility for that time and strike,
+            nan if the price is outside the no-arbitrage bounds
         """
-    ImpliedVolatility = 0.3
+    ImpliedVolatility, Iterations, Converged = findImpliedVolatilities(TargetValue, InitialAssetPrice, Strike,
+                                                                        Time, RiskFreeReturn, MaxIteration, Precision)
+    return np.float64(ImpliedVolatility)
+
+
+def checkArbitrageBounds(TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn):
+    """ No-arbitrage bounds of the call prices
+        This method checks which prices have an implied volatility, that
+        is the prices strictly between the discounted intrinsic value
+        max(S - K*exp(-r*t), 0), reached with a zero volatility, and the
+        initial asset price, reached with an infinite volatility.
+
+        Parameters
+            TargetValues : the call prices
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strikes of the options
+            Time : the options expiration times
+            RiskFreeReturn : the risk-free return
+
+        Returns
+            The boolean array of the prices with a valid implied volatility
+    """
+    with np.errstate(invalid='ignore'):
+        LowerBound = np.maximum(InitialAssetPrice - Strike*np.exp(-RiskFreeReturn*Time), 0)
+        return ((TargetValues > LowerBound) & (TargetValues < InitialAssetPrice) &
+                (np.asarray(Time) > 0) & (np.asarray(Strike) > 0))
+
+
+def guessImpliedVolatility(TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn):
+    """ Initial guess of the implied volatility
+        This method implements the Corrado-Miller approximation of the
+        implied volatility, falling back to the Brenner-Subrahmanyam one
+        where the former is not defined.
+
+        Parameters
+            TargetValues : the call prices
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strikes of the options
+            Time : the options expiration times
+            RiskFreeReturn : the risk-free return
+
+        Returns
+            The array of the approximated implied volatilities
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        DiscountedStrike = Strike*np.exp(-RiskFreeReturn*Time)
+        Moneyness = InitialAssetPrice - DiscountedStrike
+        Center = TargetValues - 0.5*Moneyness
+        Root = np.sqrt(np.maximum(Center**2 - Moneyness**2/np.pi, 0))
+        CorradoMiller = np.sqrt(2*np.pi)/(InitialAssetPrice + DiscountedStrike)*(Center + Root)/np.sqrt(Time)
+        BrennerSubrahmanyam = np.sqrt(2*np.pi/Time)*TargetValues/InitialAssetPrice
+        return np.where(np.isfinite(CorradoMiller) & (CorradoMiller > 0), CorradoMiller, BrennerSubrahmanyam)
+
+
+def findImpliedVolatilities(TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn, MaxIteration, Precision):
+    """ Batched implied volatility Newton-Raphson
+        This method implements the Newton-Raphson method to compute the
+        implied volatility of many prices at the same time. All the
+        parameters can be broadcastable arrays: each iteration updates
+        only the elements that have not reached the precision yet, while
+        the converged ones are frozen.
+        The iterations start from the Corrado-Miller approximation and
+        each element keeps a bracket of volatilities around the solution:
+        when the Newton step falls outside the bracket it is replaced by
+        a bisection, so every element converges even where the vega is
+        close to zero. An element has converged when both the price and the
+        Newton step of the volatility are below the precision, or when the
+        bracket is narrower than the precision relative to the volatility,
+        so the flat prices far from the money do not stop at a wrong
+        volatility. The prices outside the no-arbitrage bounds have no
+        implied volatility and are set to nan.
+
+        Parameters
+            TargetValues : the prices of which we want to compute
+                           the Black-Scholes volatility
+            InitialAssetPrice : the initial value of the assets
+            Strike : the strikes of the options
+            Time : the options expiration times
+            RiskFreeReturn : the risk-free return
+            MaxIteration : max number of iterations
+            Precision : the precision respect to the target values and
+                        to the volatilities
+
+        Returns
+            The array of the implied volatilities, the array with the
+            number of iterations done for each element and the array
+            of the convergence flags
+    """
+    Arrays = np.broadcast_arrays(*[np.asarray(Array, dtype=float) for Array in
+                                   (TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn)])
+    Shape = Arrays[0].shape
+    TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn = [Array.ravel() for Array in Arrays]
+    Valid = checkArbitrageBounds(TargetValues, InitialAssetPrice, Strike, Time, RiskFreeReturn)
+    ImpliedVolatility = np.full(TargetValues.size, np.nan)
+    Iterations = np.zeros(TargetValues.size, dtype=int)
+    Converged = np.zeros(TargetValues.size, dtype=bool)
+    Active = np.flatnonzero(Valid)
+    Parameters = (InitialAssetPrice[Active], Strike[Active], Time[Active], RiskFreeReturn[Active])
+    # Bracket of volatilities, expanded until the price of the upper end is above the target
+    LowerVolatility = np.zeros(Active.size); UpperVolatility = np.ones(Active.size)
+    for i in range(64):
+        Below = np.atleast_1d(blackScholesCallPrice(*Parameters, UpperVolatility)) < TargetValues[Active]
+        if not Below.any():
+            break
+        LowerVolatility[Below] = UpperVolatility[Below]; UpperVolatility[Below] *= 2
+    # The guesses outside the bracket start from its midpoint, an end of the bracket can be far from the solution
+    Guess = guessImpliedVolatility(TargetValues[Active], *Parameters)
+    ImpliedVolatility[Active] = np.where((Guess > LowerVolatility) & (Guess < UpperVolatility), Guess,
+                                         0.5*(LowerVolatility + UpperVolatility))
     for i in range(0, MaxIteration):
-        CallPrice = blackScholesCallPrice(InitialAssetPrice, Strike, Time, RiskFreeReturn, ImpliedVolatility)
-        VegaGreek = blackScholesVegaGreek(InitialAssetPrice, Strike, Time, RiskFreeReturn, ImpliedVolatility)
-        Difference = TargetValue - CallPrice
-        if (abs(Difference) < Precision):
-            return np.float64(ImpliedVolatility)
-        ImpliedVolatility = ImpliedVolatility + np.divide(Difference,VegaGreek)
-    warnings.warn("Max Number of Iterations Reached")
-    return ImpliedVolatility
+        if Active.size == 0:
+            break
+        Volatility = ImpliedVolatility[Active]
+        Difference = TargetValues[Active] - np.atleast_1d(blackScholesCallPrice(*Parameters, Volatility))
+        VegaGreek = np.atleast_1d(blackScholesVegaGreek(*Parameters, Volatility))
+        Width = UpperVolatility - LowerVolatility
+        # The bracket can not be reduced anymore when it is as small as the float resolution
+        Done = (((np.abs(Difference) < Precision) & ((np.abs(Difference) < Precision*VegaGreek) |
+                                                     (Width <= Precision*Volatility))) |
+                (Width <= 4*np.spacing(UpperVolatility)))
+        Converged[Active[Done]] = True
+        Keep = ~Done
+        Active, Difference, Volatility, VegaGreek = Active[Keep], Difference[Keep], Volatility[Keep], VegaGreek[Keep]
+        Parameters = tuple(Parameter[Keep] for Parameter in Parameters)
+        LowerVolatility = np.where(Difference > 0, Volatility, LowerVolatility[Keep])
+        UpperVolatility = np.where(Difference < 0, Volatility, UpperVolatility[Keep])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            NewtonVolatility = Volatility + np.divide(Difference, VegaGreek)
+        Inside = np.isfinite(NewtonVolatility) & (NewtonVolatility > LowerVolatility) & (NewtonVolatility < UpperVolatility)
+        ImpliedVolatility[Active] = np.where(Inside, NewtonVolatility, 0.5*(LowerVolatility + UpperVolatility))
+        Iterations[Active] += 1
+    if Active.size > 0:
+        warnings.warn("Max Number of Iterations Reached")
+    if not Valid.all():
+        warnings.warn("No Implied Volatility for " + str(np.count_nonzero(~Valid)) +
+                      " Prices Outside the No-Arbitrage Bounds")
+    return ImpliedVolatility.reshape(Shape), Iterations.reshape(Shape), Converged.reshape(Shape)
+
+
+def findImpliedVolatilityMatrix(PricesMatrix, InitialAssetPrice, StrikeArray, TimesArray, RiskFreeReturn,
+                                MaxIteration, Precision):
+    """ Implied volatility matrix
+        This method inverts the whole prices matrix at once, with the
+        expiration times on the rows and the strikes on the columns.
+
+        Parameters
+            PricesMatrix : the matrix of the call prices
+            InitialAssetPrice : the initial value of the assets
+            StrikeArray : an array with all the strikes, one for each column
+            TimesArray : an array with all the expiration times, one for each row
+            RiskFreeReturn : the risk-free return
+            MaxIteration : max number of iterations
+            Precision : the precision respect to the target values
+
+        Returns
+            The implied volatility matrix, the matrix of the number of
+            iterations and the matrix of the convergence flags
+    """
+    return findImpliedVolatilities(PricesMatrix, InitialAssetPrice, np.asarray(StrikeArray)[np.newaxis,:],
+                                   np.asarray(TimesArray)[:,np.newaxis], RiskFreeReturn, MaxIteration, Precision)
+
+def findImpliedVolatilitySurface(Surface, InitialAssetPrice, RiskFreeReturn, MaxIteration, Precision,
+                                 PreviousSurface=None):
+    """ Implied volatility surface
+        This method inverts the prices of a surface of generatePricesSurface.
+        The cells reused from a previous surface have the same prices, so
+        their volatilities are taken from it and only the new cells are
+        inverted; each cell is solved on its own, so the result is the one
+        of findImpliedVolatilityMatrix.
+
+        Parameters
+            Surface : the dictionary of the surface
+            InitialAssetPrice : the initial value of the assets
+            RiskFreeReturn : the risk-free return
+            MaxIteration : max number of iterations
+            Precision : the precision respect to the target values
+            PreviousSurface : the previous surface with its VolatilityMatrix,
+                      IterationsMatrix and ConvergedMatrix, None to invert
+                      all the cells
+
+        Returns
+            The implied volatility matrix, the matrix of the number of
+            iterations and the matrix of the convergence flags
+    """
+    TimesArray, StrikeArray = Surface['TimesArray'], Surface['StrikeArray']
+    if PreviousSurface is None or not Surface['ReusedMatrix'].any():
+        return findImpliedVolatilityMatrix(Surface['PricesMatrix'], InitialAssetPrice, StrikeArray, TimesArray,
+                                           RiskFreeReturn, MaxIteration, Precision)
+    ReusedMatrix = Surface['ReusedMatrix']
+    Cells = mapPreviousSurface(PreviousSurface, TimesArray, StrikeArray)[1]
+    Matrices = (np.full(ReusedMatrix.shape, np.nan), np.zeros(ReusedMatrix.shape, dtype=int),
+                np.zeros(ReusedMatrix.shape, dtype=bool))
+    for Name, Matrix in zip(('VolatilityMatrix', 'IterationsMatrix', 'ConvergedMatrix'), Matrices):
+        Matrix[ReusedMatrix] = np.asarray(PreviousSurface[Name])[Cells][ReusedMatrix]
+    New = ~ReusedMatrix
+    if New.any():
+        StrikesMeshgrid, TimesMeshgrid = np.meshgrid(StrikeArray, TimesArray)
+        for Matrix, Values in zip(Matrices, findImpliedVolatilities(
+                Surface['PricesMatrix'][New], InitialAssetPrice, StrikesMeshgrid[New], TimesMeshgrid[New],
+                RiskFreeReturn, MaxIteration, Precision)):
+            Matrix[New] = Values
+    return Matrices
+
+def findBlackScholesGreeksSurface(Surface, InitialAssetPrice, RiskFreeReturn):
+    """ Black-Scholes Greeks surface
+        This method computes the closed form Black-Scholes Greeks of all the
+        cells of a surface at their implied volatilities, at once. The cells
+        without an implied volatility have no Greeks and are set to nan.
+
+        Parameters
+            Surface : the dictionary of the surface, with its VolatilityMatrix
+            InitialAssetPrice : the initial value of the assets
+            RiskFreeReturn : the risk-free return
+
+        Returns
+            The dictionary with the BlackScholesDeltaMatrix,
+            BlackScholesGammaMatrix, BlackScholesVegaMatrix and
+            BlackScholesThetaMatrix matrices
+    """
+    VolatilityMatrix = Surface['VolatilityMatrix']
+    Parameters = (InitialAssetPrice, np.asarray(Surface['StrikeArray'])[np.newaxis,:],
+                  np.asarray(Surface['TimesArray'])[:,np.newaxis], RiskFreeReturn, VolatilityMatrix)
+    Formulas = {'Delta': blackScholesDeltaGreek, 'Gamma': blackScholesGammaGreek, 'Vega': blackScholesVegaGreek,
+                'Theta': blackScholesThetaGreek}
+    return {'BlackScholes' + Name + 'Matrix': np.where(np.isnan(VolatilityMatrix), np.nan,
+                                                       Formulas[Name](*Parameters))
+            for Name in GreekNames}
@@ -1,3 +1,7 @@
+import os
+import sys
+
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 
@@ -22,6 +26,7 @@ def generatePriceChart(StikesMeshgrid, TimeMeshgrid, PricesMatrix, PricesChartPa
     ax.tick_params(axis='both', which='major', labelsize=10)
     plt.title('Price Chart', fontsize='24')
     plt.savefig(PricesChartPath, dpi = 300)
+    plt.close(fig)
 
 def generateImpliedVolatilityChart(StikesMeshgrid, TimeMeshgrid, VolatilityMatrix, VolatilityChartPath):
     """ This method plot the implied volatility chart.
@@ -44,3 +49,31 @@ def generateImpliedVolatilityChart(StikesMeshgrid, TimeMeshgrid, VolatilityMatri
     ax.tick_params(axis='both', which='major', labelsize=10)
     plt.title(' Volatility Chart', fontsize='24')
     plt.savefig(VolatilityChartPath, dpi = 300)
+    plt.close(fig)
+
+def generateCharts(SurfacePath, PricesChartPath=None, VolatilityChartPath=None, Remove=False):
+    """ This method plot the charts of a surface stored in a .npz file,
+        as the ones written by vol.py, so that they can be rendered in
+        another process.
+
+        Parameters
+            SurfacePath : the path of the .npz file with the TimesArray,
+                          StrikeArray, PricesMatrix and VolatilityMatrix
+            PricesChartPath : the path to save the price chart, None to skip it
+            VolatilityChartPath : the path to save the volatility chart, None to skip it
+            Remove : True to remove the .npz file once it has been read
+        """
+    with np.load(SurfacePath) as Surface:
+        StikesMeshgrid, TimeMeshgrid = np.meshgrid(Surface['StrikeArray'], Surface['TimesArray'])
+        PricesMatrix, VolatilityMatrix = Surface['PricesMatrix'], Surface['VolatilityMatrix']
+    if Remove:
+        os.remove(SurfacePath)
+    if PricesChartPath:
+        generatePriceChart(StikesMeshgrid, TimeMeshgrid, PricesMatrix, PricesChartPath)
+    if VolatilityChartPath:
+        generateImpliedVolatilityChart(StikesMeshgrid, TimeMeshgrid, VolatilityMatrix, VolatilityChartPath)
+
+# Run as: python3 graph.py Surface.npz PriceChart.png VolatilityChart.png [--remove]
+if __name__ == '__main__':
+    Arguments = [Argument for Argument in sys.argv[1:] if Argument != '--remove']
+    generateCharts(*Arguments, Remove='--remove' in sys.argv[1:])
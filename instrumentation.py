@@ -0,0 +1,174 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def loggingSink(Logger=None, Level=logging.INFO):
+    """ Logging sink
+        This method builds a sink that writes each event as a line of the logger.
+
+        Parameters
+            Logger : the logger, None for the 'implied_volatility' logger
+            Level : the level of the messages
+
+        Returns
+            The sink, a function that takes the event dictionary
+    """
+    if Logger is None:
+        Logger = logging.getLogger('implied_volatility')
+    def Sink(Event):
+        Logger.log(Level, ' '.join(str(Key) + '=' + str(Value) for Key, Value in Event.items()))
+    return Sink
+
+
+def jsonLinesSink(Path):
+    """ JSON lines sink
+        This method builds a sink that appends each event as a JSON line to a file.
+
+        Parameters
+            Path : the path of the file
+
+        Returns
+            The sink, a function that takes the event dictionary
+    """
+    def Sink(Event):
+        with open(Path, 'a') as File:
+            File.write(json.dumps(Event, default=str) + '\n')
+    return Sink
+
+
+def peakMemory(Children=False):
+    """ Peak memory
+        This method reads the peak resident memory of the process or, for the
+        worker processes of the parallel mode, the largest peak among the
+        terminated children, which is not their sum.
+
+        Parameters
+            Children : True for the terminated child processes, False for the process itself
+
+        Returns
+            The peak resident memory in bytes, None where it is not available
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    Scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_CHILDREN if Children else resource.RUSAGE_SELF).ru_maxrss*Scale
+
+
+class Instrumentation:
+    """ Instrumentation of the pipeline
+        This class accumulates the time spent in each stage of the pipeline
+        and sends the events, like the progress of the rows or the solver
+        iterations, to the sinks: functions that take the event dictionary,
+        as the ones of loggingSink and jsonLinesSink or any callback.
+        Without sinks the instrumentation is quiet: the stages return a
+        shared empty context and the engine skips its timers entirely.
+
+        Parameters
+            Sinks : the list of the sinks, None or empty for the quiet mode
+            Enabled : True to collect the timings even without sinks, as the
+                      workers of the parallel mode do
+    """
+
+    def __init__(self, Sinks=None, Enabled=None):
+        self.Sinks = list(Sinks or [])
+        self.Enabled = bool(self.Sinks) if Enabled is None else Enabled
+        self.Timings = {}
+        self.InitialTime = time.perf_counter()
+
+    def add(self, Stage, Seconds):
+        """ Add time to a stage
+            This method adds the seconds to the total time of the stage.
+
+            Parameters
+                Stage : the name of the stage
+                Seconds : the time spent in the stage
+        """
+        self.Timings[Stage] = self.Timings.get(Stage, 0.0) + Seconds
+
+    def merge(self, Timings):
+        """ Merge timings
+            This method adds the timings collected elsewhere, like in a worker process.
+
+            Parameters
+                Timings : the dictionary of the seconds spent in each stage
+        """
+        for Stage, Seconds in Timings.items():
+            self.add(Stage, Seconds)
+
+    def stage(self, Stage):
+        """ Time a stage
+            This method returns a context that adds its duration to the stage.
+
+            Parameters
+                Stage : the name of the stage
+
+            Returns
+                The context manager
+        """
+        if not self.Enabled:
+            return nullcontext()
+        return self._timer(Stage)
+
+    @contextmanager
+    def _timer(self, Stage):
+        InitialTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(Stage, time.perf_counter()-InitialTime)
+
+    def record(self, Event, **Fields):
+        """ Record an event
+            This method sends an event to all the sinks, with the time elapsed
+            since the creation of the instrumentation.
+
+            Parameters
+                Event : the name of the event
+                Fields : the values of the event
+        """
+        if not self.Sinks:
+            return
+        Message = dict(event=Event, elapsed=round(time.perf_counter()-self.InitialTime, 6), **Fields)
+        for Sink in self.Sinks:
+            Sink(Message)
+
+    def report(self):
+        """ Report the summary
+            This method records the timings of all the stages and the peak
+            memory of the process and of its terminated workers.
+
+            Returns
+                The dictionary with the seconds spent in each stage
+        """
+        self.record('summary', stages={Stage: round(Seconds, 6) for Stage, Seconds in self.Timings.items()},
+                    peak_memory=peakMemory(), peak_children_memory=peakMemory(Children=True))
+        return dict(self.Timings)
+
+
+def runInstrumented(Function, *Arguments):
+    """ Run an instrumented function
+        This method runs the function with a new collecting instrumentation,
+        so that a worker process can send back the timings of its stages.
+
+        Parameters
+            Function : the function, that takes the Instrumentation keyword
+            Arguments : the positional arguments of the function
+
+        Returns
+            The result of the function and the dictionary of its timings
+    """
+    Child = Instrumentation(Enabled=True)
+    return Function(*Arguments, Instrumentation=Child), Child.Timings
+
+
+# The shared quiet instrumentation, used when none is given
+Quiet = Instrumentation()
@@ -0,0 +1,186 @@
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# True when numba is installed: the kernels rely on the wrapping arithmetic of
+# its 64 bits integers, so without it the numpy backend is used instead
+Available = numba is not None
+
+# The samples of each chunk, whose sums are reduced in order after the parallel
+# loop, so that the statistics do not depend on the number of threads
+ChunkSize = 1024
+
+Gamma = np.uint64(0x9E3779B97F4A7C15)
+Shift53 = 2.0**-53
+
+
+def jit(Function):
+    """ Compile a kernel
+        This method compiles the function with numba, in parallel and with
+        the compiled code cached on disk, when numba is installed.
+
+        Parameters
+            Function : the function to compile
+
+        Returns
+            The compiled function, or the function itself without numba
+    """
+    if numba is None:
+        return Function
+    return numba.njit(parallel=True, cache=True, fastmath=False)(Function)
+
+
+def jitInline(Function):
+    """ Compile a helper
+        This method compiles a helper of the kernels, that is inlined in them.
+
+        Parameters
+            Function : the function to compile
+
+        Returns
+            The compiled function, or the function itself without numba
+    """
+    if numba is None:
+        return Function
+    return numba.njit(inline='always', cache=True)(Function)
+
+
+prange = range if numba is None else numba.prange
+
+
+@jitInline
+def mix(State):
+    """ SplitMix64 finalizer
+        This method scrambles the bits of a 64 bits integer.
+
+        Parameters
+            State : the unsigned 64 bits integer
+
+        Returns
+            The scrambled unsigned 64 bits integer
+    """
+    State = (State ^ (State >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+    State = (State ^ (State >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+    return State ^ (State >> np.uint64(31))
+
+
+@jitInline
+def uniform(State, Counter):
+    """ Counter-based uniform
+        This method computes the uniform observation of the given counter
+        of the stream, strictly between 0 and 1.
+
+        Parameters
+            State : the unsigned 64 bits key of the stream
+            Counter : the index of the observation in the stream
+
+        Returns
+            The uniform observation
+    """
+    return (float(mix(State+np.uint64(Counter+1)*Gamma) >> np.uint64(11))+0.5)*Shift53
+
+
+@jit
+def computeBlockStatistics(Key, StrikeArray, IntervalsNumber, Start, BlockSize, InitialAssetPrice, Drift, Diffusion,
+                           Antithetic, ControlDrift, ControlDiffusion, Control, Greeks, Coefficients, PayoffWeights):
+    """ Fused statistics of a block of paths
+        This method evolves each path of the block through all the time
+        steps and accumulates its payoffs, in a single parallel loop over
+        the chunks of paths that keeps the asset prices in registers.
+        The normals come from a counter-based generator: each sample has
+        its own stream, keyed by the key of the seed and by the index of
+        the sample, so the paths do not depend on the order in which they
+        are evolved nor on the split of the samples in blocks. The normals are drawn in pairs with the Marsaglia polar method.
+
+        Parameters
+            Key : the unsigned 64 bits key of the random streams
+            StrikeArray : an array with all the strikes for the Call
+            IntervalsNumber : the number of steps of each path
+            Start : the index of the first sample of the block
+            BlockSize : the number of samples of the block
+            InitialAssetPrice : the initial price of the underlying asset
+            Drift, Diffusion : the factor and the diffusion of a step of the
+                      Euler scheme, 1+r*dt and sigma*sqrt(dt), or the ones of
+                      the whole scheme for a single terminal step
+            Antithetic : True to drive two paths, with opposite normals, for each sample
+            ControlDrift, ControlDiffusion : the exponent of a step of the control
+            Control : True to evolve the geometric Brownian motion used as control
+            Greeks : True to add the sums of the estimators of the Greeks
+            Coefficients, PayoffWeights : the weights of the Greeks of
+                      func.computeGreekWeights
+
+        Returns
+            The matrix of the sums of the undiscounted payoffs with one column
+            for each strike, as the one of func.computeBlockStatistics
+    """
+    StrikesNumber = StrikeArray.shape[0]
+    GreeksNumber = Coefficients.shape[0] if Greeks else 0
+    Rows = 6+2*GreeksNumber
+    ChunksNumber = (BlockSize+ChunkSize-1)//ChunkSize
+    Partials = np.zeros((ChunksNumber, Rows, StrikesNumber))
+    for Chunk in prange(ChunksNumber):
+        Sums = np.zeros((Rows, StrikesNumber))
+        # The weights of the Greeks of the path and of its antithetic one
+        Weights = np.zeros((2, GreeksNumber))
+        for Sample in range(Chunk*ChunkSize, min(BlockSize, (Chunk+1)*ChunkSize)):
+            State = mix(Key ^ mix(np.uint64(Start+Sample)))
+            # The paths driven by the normals and, for the antithetic variates, by the opposite ones
+            Price = Mirror = ControlPrice = ControlMirror = InitialAssetPrice
+            Counter = 0
+            Spare = 0.0
+            for Step in range(IntervalsNumber):
+                if Step % 2 == 0:
+                    # Marsaglia polar method, the pairs outside the unit circle are rejected
+                    Radius = 2.0
+                    while Radius >= 1.0 or Radius == 0.0:
+                        First = 2.0*uniform(State, Counter)-1.0
+                        Second = 2.0*uniform(State, Counter+1)-1.0
+                        Counter += 2
+                        Radius = First*First+Second*Second
+                    Scale = math.sqrt(-2.0*math.log(Radius)/Radius)
+                    Normal = First*Scale
+                    Spare = Second*Scale
+                else:
+                    Normal = Spare
+                Price = Price*Drift+Diffusion*Normal
+                if Antithetic:
+                    Mirror = Mirror*Drift-Diffusion*Normal
+                if Control:
+                    ControlPrice *= math.exp(ControlDrift+ControlDiffusion*Normal)
+                    if Antithetic:
+                        ControlMirror *= math.exp(ControlDrift-ControlDiffusion*Normal)
+            for Path in range(2 if Antithetic else 1):
+                Final = Price if Path == 0 else Mirror
+                for g in range(GreeksNumber):
+                    Weights[Path,g] = Coefficients[g,0]+Coefficients[g,1]*Final
+            for k in range(StrikesNumber):
+                Payoff = max(Price-StrikeArray[k], 0.0)
+                if Antithetic:
+                    Payoff = 0.5*(Payoff+max(Mirror-StrikeArray[k], 0.0))
+                Sums[1,k] += Payoff
+                Sums[2,k] += Payoff*Payoff
+                if Control:
+                    ControlPayoff = max(ControlPrice-StrikeArray[k], 0.0)
+                    if Antithetic:
+                        ControlPayoff = 0.5*(ControlPayoff+max(ControlMirror-StrikeArray[k], 0.0))
+                    Sums[3,k] += ControlPayoff
+                    Sums[4,k] += ControlPayoff*ControlPayoff
+                    Sums[5,k] += Payoff*ControlPayoff
+                for g in range(GreeksNumber):
+                    Greek = Weights[0,g] if Price > StrikeArray[k] else 0.0
+                    if Antithetic:
+                        Greek = 0.5*(Greek+(Weights[1,g] if Mirror > StrikeArray[k] else 0.0))
+                    Greek += PayoffWeights[g]*Payoff
+                    Sums[6+2*g,k] += Greek
+                    Sums[7+2*g,k] += Greek*Greek
+        Partials[Chunk] = Sums
+    Statistics = np.zeros((Rows, StrikesNumber))
+    for Chunk in range(ChunksNumber):
+        Statistics += Partials[Chunk]
+    Statistics[0,:] = BlockSize
+    return Statistics
@@ -0,0 +1,171 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+import func as f
+from instrumentation import Quiet
+
+# Default columns of the quotes, with the expiration time in years
+Columns = {'spot': 'spot', 'strike': 'strike', 'expiry': 'expiry', 'rate': 'rate', 'price': 'price'}
+ParquetExtensions = ('.parquet', '.pq')
+
+
+def importArrow():
+    """ Parquet support
+        This method imports pyarrow, that is needed only for the Parquet files.
+
+        Returns
+            The pyarrow module, with its parquet module
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet files need pyarrow: pip install pyarrow') from None
+    return pyarrow
+
+
+def isParquet(Path):
+    """ Parquet file
+        This method tells from the extension if the file is a Parquet file.
+
+        Parameters
+            Path : the path of the file
+
+        Returns
+            True for a Parquet file, False for a CSV file
+    """
+    return os.path.splitext(Path)[1].lower() in ParquetExtensions
+
+
+def readQuotes(Path, ChunkSize=100000):
+    """ Read the quotes
+        This method reads a CSV or Parquet file of quotes in chunks, so
+        that only one chunk at a time is in memory.
+
+        Parameters
+            Path : the path of the file
+            ChunkSize : the number of quotes of each chunk
+
+        Returns
+            A generator of the pandas.DataFrame chunks
+    """
+    if isParquet(Path):
+        File = importArrow().parquet.ParquetFile(Path)
+        for Batch in File.iter_batches(batch_size=ChunkSize):
+            yield Batch.to_pandas()
+    else:
+        with pd.read_csv(Path, chunksize=ChunkSize) as Reader:
+            yield from Reader
+
+
+def invertQuotes(Chunk, MaxIteration, Precision, QuoteColumns=None):
+    """ Implied volatilities of the quotes
+        This method inverts all the quotes of a chunk at once with the
+        batched Newton-Raphson method.
+
+        Parameters
+            Chunk : the pandas.DataFrame of the quotes
+            MaxIteration : max number of iterations
+            Precision : the precision respect to the prices
+            QuoteColumns : the dictionary from spot, strike, expiry, rate and
+                      price to the names of their columns, None for the default
+
+        Returns
+            The chunk with the quote columns in float64, whatever type has
+            been inferred for the chunk, and the ImpliedVolatility,
+            Iterations and Converged columns
+    """
+    QuoteColumns = dict(Columns, **(QuoteColumns or {}))
+    Values = {Name: Chunk[Column].to_numpy(dtype=float) for Name, Column in QuoteColumns.items()}
+    ImpliedVolatility, Iterations, Converged = f.findImpliedVolatilities(Values['price'], Values['spot'],
+        Values['strike'], Values['expiry'], Values['rate'], MaxIteration, Precision)
+    return Chunk.assign(**{Column: Values[Name] for Name, Column in QuoteColumns.items()},
+                        ImpliedVolatility=ImpliedVolatility, Iterations=Iterations, Converged=Converged)
+
+
+def processQuotes(InputPath, OutputPath, MaxIteration=10000, Precision=1.0e-8, ChunkSize=100000,
+                  QuoteColumns=None, Instrumentation=Quiet):
+    """ Batch of quotes
+        This method streams the quotes of the input file, inverts each chunk
+        and appends it to the output file, CSV or Parquet by its extension.
+
+        Parameters
+            InputPath : the path of the file of the quotes
+            OutputPath : the path of the file of the implied volatilities
+            MaxIteration : max number of iterations
+            Precision : the precision respect to the prices
+            ChunkSize : the number of quotes of each chunk
+            QuoteColumns : the dictionary from spot, strike, expiry, rate and
+                      price to the names of their columns, None for the default
+            Instrumentation : the instrumentation that times the stages and
+                      records the progress of each chunk
+
+        Returns
+            The dictionary with the number of quotes and of converged quotes
+    """
+    Writer = None
+    Quotes, ConvergedQuotes = 0, 0
+    try:
+        Chunks = readQuotes(InputPath, ChunkSize)
+        while True:
+            with Instrumentation.stage('read'):
+                Chunk = next(Chunks, None)
+            if Chunk is None:
+                break
+            with Instrumentation.stage('inversion'):
+                Chunk = invertQuotes(Chunk, MaxIteration, Precision, QuoteColumns)
+            with Instrumentation.stage('write'):
+                if isParquet(OutputPath):
+                    Arrow = importArrow()
+                    Table = Arrow.Table.from_pandas(Chunk, preserve_index=False)
+                    if Writer is None:
+                        Writer = Arrow.parquet.ParquetWriter(OutputPath, Table.schema)
+                    # The types of the other columns are inferred for each chunk of a CSV file
+                    Writer.write_table(Table.cast(Writer.schema))
+                else:
+                    Chunk.to_csv(OutputPath, mode='w' if Quotes == 0 else 'a', header=Quotes == 0, index=False)
+            Quotes += len(Chunk)
+            ConvergedQuotes += int(Chunk['Converged'].sum())
+            Instrumentation.record('chunk', quotes=Quotes, converged=ConvergedQuotes)
+    finally:
+        if Writer is not None:
+            Writer.close()
+    return {'quotes': Quotes, 'converged': ConvergedQuotes}
+
+
+def main(Arguments=None):
+    """ Command line
+        This method inverts a file of market quotes.
+
+        Parameters
+            Arguments : the list of the command line arguments, None for sys.argv
+
+        Returns
+            The exit status, 1 if some quotes have not converged
+    """
+    Parser = argparse.ArgumentParser(description='Implied volatilities of a CSV or Parquet file of call quotes')
+    Parser.add_argument('input', help='path of the quotes, with spot, strike, expiry in years, rate and price')
+    Parser.add_argument('output', help='path of the implied volatilities, CSV or Parquet by the extension')
+    Parser.add_argument('--chunk-size', type=int, default=100000, help='number of quotes of each chunk')
+    Parser.add_argument('--max-iteration', type=int, default=10000, help='max number of Newton iterations')
+    Parser.add_argument('--precision', type=float, default=1.0e-8, help='precision respect to the prices')
+    Parser.add_argument('--column', action='append', default=[], metavar='NAME=COLUMN',
+                        help='name of the column of spot, strike, expiry, rate or price, like price=mid')
+    Arguments = Parser.parse_args(Arguments)
+    QuoteColumns = {}
+    for Column in Arguments.column:
+        Name, _, Header = Column.partition('=')
+        if Name not in Columns or not Header:
+            Parser.error('invalid column ' + Column)
+        QuoteColumns[Name] = Header
+    Summary = processQuotes(Arguments.input, Arguments.output, Arguments.max_iteration, Arguments.precision,
+                            Arguments.chunk_size, QuoteColumns)
+    print('Quotes: ', Summary['quotes'], 'Converged: ', Summary['converged'])
+    return 0 if Summary['converged'] == Summary['quotes'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
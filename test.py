@@ -1,6 +1,17 @@
 import func as f
+import bench
+import instrumentation as ins
+import cache as c
+import quotes as q
+import kernel
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
 import pytest
 import numpy as np
+import pandas as pd
 import unittest
 from hypothesis import given, settings
 import hypothesis.strategies as st
@@ -92,6 +103,67 @@ class Test(unittest.TestCase):
             AttualizationFactor, NormalMatrix), 0)
 
 
+    def test_computePricesArray(self):
+        """ Test function prices array
+            The trajectories do not depend on the strike, so pricing all
+            the strikes in a single pass has to give the same results of
+            pricing them one by one.
+
+            Tests:
+            if each element is equal to the price computed with computeSinglePrice
+            if the output has one price for each strike
+        """
+        StrikeArray = np.array([0, 1, Strike])
+        PricesArray = f.computePricesArray(DeltaTime, StrikeArray, IntervalsNumber,
+            SimulationNumbers, InitialAssetPrice, RiskFreeReturn, Volatility,
+            AttualizationFactor, NormalMatrix)
+        assert PricesArray.shape == (3,)
+        for g in range(len(StrikeArray)):
+            self.assertEqual(PricesArray[g], f.computeSinglePrice(DeltaTime, StrikeArray[g],
+                IntervalsNumber, SimulationNumbers, InitialAssetPrice, RiskFreeReturn,
+                Volatility, AttualizationFactor, NormalMatrix))
+
+
+    def test_computeStreamedPrices(self):
+        """ Test streamed prices
+            The streaming engine draws the same normals of a full matrix
+            generated from the same stream, but one time step at a time.
+
+            Tests:
+            if with a single stream the prices are almost equal to the ones
+                computed with the full normal matrix drawn from the same stream
+            if the prices do not depend on the block size
+            if the prices of a grid do not depend on the memory ceiling and on the other strikes
+            if the standard errors are positive
+            if the memory ceiling gives at least one path for each block and whole streams
+        """
+        StrikeArray = np.array([0.5, 1, Strike])
+        Intervals, Simulations = 100, 1000
+        Generator = np.random.default_rng(np.random.SeedSequence(RandomSeed, spawn_key=(0,)))
+        # The stream draws the normals of all its samples at each step
+        Normals = Generator.standard_normal((Intervals, f.StreamSize))[:,:Simulations]
+        Expected = f.computePricesArray(Time/Intervals, StrikeArray, Intervals, Simulations,
+            InitialAssetPrice, RiskFreeReturn, Volatility, AttualizationFactor, Normals)
+        Streamed, Errors = f.computeStreamedPrices(Time, StrikeArray, Intervals, Simulations,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed)
+        np.testing.assert_allclose(Streamed, Expected, rtol=1e-10)
+        Simulations = 2*f.StreamSize+1000
+        Prices = f.computeStreamedPrices(Time, StrikeArray, Intervals, Simulations, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed)
+        for BlockSize in (300, f.StreamSize, 3000+f.StreamSize):
+            np.testing.assert_allclose(f.computeStreamedPrices(Time, StrikeArray, Intervals, Simulations,
+                InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, BlockSize), Prices, rtol=1e-12)
+        Single = f.generatePricesSurface([Time], [1], 50, 20000, InitialAssetPrice, RiskFreeReturn, Volatility, 7,
+            MaxMemory=1)
+        Grid = f.generatePricesSurface([Time], np.linspace(0.5, 1.5, 11), 50, 20000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, 7, MaxMemory=0.1)
+        np.testing.assert_allclose(Grid['PricesMatrix'][:,5], Single['PricesMatrix'][:,0], rtol=1e-12)
+        assert (Errors > 0).all()
+        assert f.computeBlockSize(None, 10) is None
+        assert f.computeBlockSize(0, 10) == 1
+        assert f.computeBlockSize(1, 10) == 2**20//112//f.StreamSize*f.StreamSize
+
+
     @settings(deadline=None, max_examples=25)
     @given(TimesArray=st.just(np.linspace(0.5, 2, 10)),
            StrikeArray=st.just(np.linspace(0.5, 1.5, 10)),
@@ -114,6 +186,392 @@ class Test(unittest.TestCase):
         assert Matrix.shape == (10,10)
 
 
+    def test_globalSeed(self):
+        """ Test the prices without a seed
+            Without a seed the streams are seeded from the global numpy
+            random state.
+
+            Tests:
+            if the prices are reproducible with np.random.seed
+            if the next calls draw new streams
+        """
+        TimesArray, StrikeArray = np.linspace(0.5, 2, 3), np.linspace(0.5, 1.5, 4)
+        np.random.seed(RandomSeed)
+        Prices = f.generatePricesMatrix(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+                                        Volatility)
+        Next = f.generatePricesMatrix(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+                                      Volatility)
+        np.random.seed(RandomSeed)
+        np.testing.assert_array_equal(Prices, f.generatePricesMatrix(TimesArray, StrikeArray, 20, 1000,
+                                      InitialAssetPrice, RiskFreeReturn, Volatility))
+        assert not np.array_equal(Prices, Next)
+
+
+    def test_varianceReduction(self):
+        """ Test the variance reduction techniques
+            The techniques change the estimator but not its expectation value,
+            so all of them have to agree within their standard errors.
+
+            Tests:
+            if the prices of each technique are within five standard errors
+                of the plain Monte Carlo prices
+            if the antithetic variates and the control variate reduce the
+                standard errors of the plain Monte Carlo
+            if the unknown techniques raise an error
+        """
+        StrikeArray = np.array([0.8, 1, 1.2])
+        Plain, PlainErrors = f.computeStreamedPrices(Time, StrikeArray, 50, 20000,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed)
+        for Techniques in ('antithetic', 'control', 'sobol', 'antithetic, control'):
+            Prices, Errors = f.computeStreamedPrices(Time, StrikeArray, 50, 20000,
+                InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, 7000, Techniques)
+            assert (np.abs(Prices-Plain) < 5*np.hypot(Errors, PlainErrors)).all()
+            if Techniques != 'sobol':
+                assert (Errors < PlainErrors).all()
+        with pytest.raises(ValueError):
+            f.parseVarianceReduction('importance')
+        assert f.parseVarianceReduction('none') == frozenset()
+
+
+    def test_terminalEngine(self):
+        """ Test the terminal sampling engine
+            The terminal engine samples exactly the final price of the Euler
+            scheme, a normal, so its prices are the exact ones of that normal
+            and agree with the ones of the Euler engine.
+
+            Tests:
+            if the prices are within five standard errors of the exact prices of the normal
+            if the prices are within four standard errors of the Euler ones
+            if the control variate reduces the standard errors
+            if the unknown engines raise an error
+        """
+        StrikeArray = np.array([0.8, 1, 1.2])
+        Growth, Deviation = f.computeTerminalLaw(Time, 10, RiskFreeReturn, Volatility)
+        d = (InitialAssetPrice*Growth-StrikeArray)/Deviation
+        Expected = np.exp(-RiskFreeReturn*Time)*((InitialAssetPrice*Growth-StrikeArray)*f.normalCdf(d)
+                                                 +Deviation*f.normalPdf(d))
+        Prices, Errors = f.computeStreamedPrices(Time, StrikeArray, 10, 100000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, None, None, 'terminal')
+        assert (np.abs(Prices-Expected) < 5*Errors).all()
+        EulerPrices, EulerErrors = f.computeStreamedPrices(Time, StrikeArray, 10, 100000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed)
+        assert (np.abs(Prices-EulerPrices) < 4*np.hypot(Errors, EulerErrors)).all()
+        ControlPrices, ControlErrors = f.computeStreamedPrices(Time, StrikeArray, 10, 100000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, None, 'control', 'terminal')
+        assert (np.abs(ControlPrices-Expected) < 5*ControlErrors).all()
+        assert (ControlErrors < Errors).all()
+        with pytest.raises(ValueError):
+            f.checkEngine('milstein')
+
+
+    def test_dataType(self):
+        """ Test the float32 paths
+            The float32 paths are evolved from another random stream, so
+            their prices differ from the float64 ones by the Monte Carlo
+            noise; the rounding of float32, about 1e-7 relative, has to
+            stay well below it, also after many Euler steps.
+
+            Tests:
+            if the float32 prices are within four standard errors, plus the rounding, of the float64 ones,
+                with and without the variance reduction techniques and for both engines
+            if with the same normals the float32 prices are the float64 ones to 1e-5
+            if the float32 block size is twice the float64 one
+            if the unknown data types raise an error
+        """
+        StrikeArray = np.array([0.5, 0.8, 1, 1.2, 1.5])
+        for VarianceReduction, Engine in ((None, 'euler'), ('control,antithetic', 'euler'), ('sobol', 'euler'),
+                                          ('control', 'terminal')):
+            Prices, Errors = f.computeStreamedPrices(Time, StrikeArray, 500, 20000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine)
+            SinglePrices, SingleErrors = f.computeStreamedPrices(Time, StrikeArray, 500, 20000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine, 'float32')
+            assert (np.abs(SinglePrices-Prices) <= 4*np.hypot(Errors, SingleErrors)+1e-6).all()
+        # The Sobol normals are the same in float32 and float64
+        Prices = f.computeStreamedPrices(Time, StrikeArray, 500, 4096, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, None, 'sobol')[0]
+        np.testing.assert_allclose(f.computeStreamedPrices(Time, StrikeArray, 500, 4096, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, None, 'sobol', 'euler', 'float32')[0], Prices, atol=1e-5)
+        assert f.computeBlockSize(3, 14, DataType='float32') == 2*f.computeBlockSize(3, 14)
+        with pytest.raises(ValueError):
+            f.checkDataType('float16')
+
+
+    def test_blockMemory(self):
+        """ Test the memory ceiling of the blocks
+            The arrays allocated to simulate a block of the size given by
+            the memory ceiling, measured with tracemalloc, have to fit in it.
+
+            Tests:
+            if the peak memory of a block is below the ceiling, with and
+            without the variance reduction techniques, in float32 and with the Greeks
+        """
+        StrikeArray = np.linspace(0.5, 1.5, 10)
+        # The direction numbers of the Sobol sequence are loaded once, before the measure
+        f.generateSobolNormals(np.random.default_rng(RandomSeed), 10, 50)
+        for Options in ({}, {'VarianceReduction': 'antithetic,control'}, {'VarianceReduction': 'sobol'},
+                        {'DataType': 'float32', 'VarianceReduction': 'control'}, {'Engine': 'terminal'},
+                        {'Greeks': True}, {'Greeks': True, 'VarianceReduction': 'antithetic,control'}):
+            BlockSize = f.computeBlockSize(16, len(StrikeArray), 50, Options.get('VarianceReduction'),
+                                           Options.get('DataType', 'float64'), Options.get('Greeks', False))
+            tracemalloc.start()
+            try:
+                f.computeBlockStatistics(Time, StrikeArray, 50, 0, BlockSize, InitialAssetPrice, RiskFreeReturn,
+                                         Volatility, RandomSeed, **Options)
+                Peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            assert Peak < 16*2**20, Options
+
+
+    @pytest.mark.skipif(not kernel.Available, reason='numba is not installed')
+    def test_numbaBackend(self):
+        """ Test the numba backend
+            The compiled kernel draws its own random streams, so its prices
+            have to agree with the ones of the numpy backend within the
+            Monte Carlo noise.
+
+            Tests:
+            if the prices are within four standard errors of the numpy ones,
+                with and without the variance reduction techniques and for both engines
+            if the standard errors are close to the numpy ones
+            if the same seed gives the same prices and the blocks do not change them
+            if float32 is replaced by float64, with a warning
+            if the Sobol normals and the unknown backends raise an error
+        """
+        StrikeArray = np.array([0.5, 0.8, 1, 1.2, 1.5])
+        for VarianceReduction, Engine in ((None, 'euler'), ('control,antithetic', 'euler'), ('control', 'terminal')):
+            Prices, Errors = f.computeStreamedPrices(Time, StrikeArray, 200, 20000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine)
+            NumbaPrices, NumbaErrors = f.computeStreamedPrices(Time, StrikeArray, 200, 20000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine, 'float64', 'numba')
+            assert (np.abs(NumbaPrices-Prices) < 4*np.hypot(Errors, NumbaErrors)).all()
+            np.testing.assert_allclose(NumbaErrors, Errors, rtol=0.25)
+        Surface = f.generatePricesSurface([0.5, 1], StrikeArray, 50, 5000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, Backend='numba')
+        np.testing.assert_array_equal(Surface['PricesMatrix'], f.generatePricesSurface([0.5, 1], StrikeArray, 50,
+            5000, InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, Backend='numba')['PricesMatrix'])
+        Blocks = f.generatePricesSurface([0.5, 1], StrikeArray, 50, 5000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, MaxMemory=0.01, Backend='numba')
+        np.testing.assert_allclose(Blocks['PricesMatrix'], Surface['PricesMatrix'], rtol=1e-12)
+        with pytest.warns(UserWarning, match='float64'):
+            Single = f.generatePricesSurface([0.5, 1], StrikeArray, 50, 5000, InitialAssetPrice, RiskFreeReturn,
+                Volatility, RandomSeed, DataType='float32', Backend='numba')
+            assert f.checkDataType('float32', 'numba') == np.float64
+        np.testing.assert_array_equal(Single['PricesMatrix'], Surface['PricesMatrix'])
+        with pytest.raises(ValueError):
+            f.generatePricesSurface([1], StrikeArray, 10, 100, InitialAssetPrice, RiskFreeReturn, Volatility,
+                RandomSeed, VarianceReduction='sobol', Backend='numba')
+        with pytest.raises(ValueError):
+            f.checkBackend('cuda')
+
+
+    def test_monteCarloGreeks(self):
+        """ Test the Monte Carlo Greeks
+            The Greeks estimated from the paths of the prices have to agree,
+            within their standard errors, with the exact ones of the normal
+            final price of the Euler scheme, that both the engines sample.
+
+            Tests:
+            if the prices do not change with the Greeks
+            if the Greeks of both the engines are the ones of the final price
+            if the Greeks of the numba backend agree with the exact ones
+        """
+        StrikeArray = np.linspace(0.7, 1.3, 5)
+        Surface = f.generatePricesSurface([0.5, Time], StrikeArray, 20, 20000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, VarianceReduction='control', Greeks=True)
+        Plain = f.generatePricesSurface([0.5, Time], StrikeArray, 20, 20000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, VarianceReduction='control')
+        np.testing.assert_array_equal(Surface['PricesMatrix'], Plain['PricesMatrix'])
+        np.testing.assert_array_equal(Surface['ErrorsMatrix'], Plain['ErrorsMatrix'])
+        # The final price of the Euler scheme is a normal with mean m and variance v
+        Growth = 1+RiskFreeReturn*Time/20
+        Mean = InitialAssetPrice*Growth**20
+        Deviation = Volatility*np.sqrt(Time/20*np.sum(Growth**(2*np.arange(20))))
+        d = (Mean-StrikeArray)/Deviation
+        Exact = AttualizationFactor*np.array([Growth**20*f.normalCdf(d), Growth**40*f.normalPdf(d)/Deviation,
+                                              Deviation/Volatility*f.normalPdf(d)])
+        Cases = [('numpy', 'euler', None), ('numpy', 'terminal', 'antithetic')]
+        if kernel.Available:
+            Cases += [('numba', 'euler', None), ('numba', 'terminal', None)]
+        for Backend, Engine, VarianceReduction in Cases:
+            Prices, Errors, Greeks, GreekErrors = f.computeStreamedPrices(Time, StrikeArray, 20, 40000,
+                InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine,
+                Backend=Backend, Greeks=True)
+            assert (np.abs(Greeks[:3]-Exact) < 5*GreekErrors[:3]).all()
+            # The theta against the central difference of the prices with the same normals
+            Later, Earlier = [f.computeStreamedPrices(Time+Step, StrikeArray, 20, 40000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, None, VarianceReduction, Engine,
+                Backend=Backend)[0] for Step in (1e-4, -1e-4)]
+            np.testing.assert_allclose(Greeks[3], -(Later-Earlier)/2e-4, atol=1e-4)
+
+
+    def test_computeAdaptivePrices(self):
+        """ Test the adaptive number of paths
+            The batches of the adaptive mode are the blocks of the streaming
+            engine, so stopping after some batches has to give the prices of
+            a run with the same number of paths.
+
+            Tests:
+            if the standard errors of all the strikes are below the target
+            if the number of paths is a multiple of the batch size
+            if the prices are equal to the ones with that number of paths
+            if a relative target stops when the relative errors are below it
+            if the number of paths does not exceed the budget
+        """
+        StrikeArray = np.array([0.8, 1, 1.2])
+        Prices, Errors, Samples = f.computeAdaptivePrices(Time, StrikeArray, 50, 1000, 100000,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, 1.0e-3)
+        assert (Errors <= 1.0e-3).all()
+        assert Samples % 1000 == 0 and Samples < 100000
+        np.testing.assert_array_equal(Prices, f.computeStreamedPrices(Time, StrikeArray, 50, Samples,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, 1000)[0])
+        Prices, Errors, Samples = f.computeAdaptivePrices(Time, StrikeArray, 50, 1000, 100000,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, 0.02, True)
+        assert (Errors <= 0.02*Prices).all()
+        Surface = f.generatePricesSurface(np.array([0.5, 1]), StrikeArray, 50, 1000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, TargetError=1.0e-9, MaxSimulationNumbers=3000)
+        np.testing.assert_array_equal(Surface['PathsMatrix'], 3000)
+
+
+    def test_generatePricesMatrixParallel(self):
+        """ Test the parallel mode
+            Each block of paths has its own random stream, so the prices
+            have to be reproducible regardless of the number of workers.
+
+            Tests:
+            if the prices computed with one, two and three workers are equal
+        """
+        TimesArray, StrikeArray = np.linspace(0.5, 2, 3), np.linspace(0.5, 1.5, 4)
+        Serial = f.generatePricesMatrix(TimesArray, StrikeArray, 50, 2000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, 0.01)
+        for Workers in (2, 3):
+            np.testing.assert_array_equal(f.generatePricesMatrix(TimesArray, StrikeArray, 50, 2000,
+                InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, 0.01, Workers), Serial)
+
+
+    def test_instrumentation(self):
+        """ Test the instrumentation
+            The instrumentation has to collect the timings of the stages and
+            send the progress of the rows to the sinks, also from the workers
+            of the parallel mode, and stay quiet without sinks.
+
+            Tests:
+            if a callback sink receives one event for each row and the summary
+            if the stages of the engine have been timed, serially and in parallel
+            if the summary reports the peak memory of the workers of the parallel mode
+            if the quiet instrumentation collects nothing
+        """
+        TimesArray, StrikeArray = np.linspace(0.5, 2, 3), np.linspace(0.5, 1.5, 4)
+        for Workers in (None, 2):
+            Events = []
+            Instrumentation = ins.Instrumentation([Events.append])
+            f.generatePricesSurface(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+                Volatility, RandomSeed, Workers=Workers, Instrumentation=Instrumentation)
+            Timings = Instrumentation.report()
+            assert [Event['row'] for Event in Events if Event['event'] == 'row'] == [0, 1, 2]
+            assert Events[-1]['event'] == 'summary'
+            assert set(Timings) == {'rng', 'paths', 'payoffs'}
+            if Workers and ins.resource is not None:
+                assert Events[-1]['peak_children_memory'] > 0
+        f.generatePricesSurface(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed)
+        assert ins.Quiet.Timings == {}
+
+
+    def test_cache(self):
+        """ Test the cache of the surfaces
+            The cache has to return the stored surfaces for the same inputs
+            and evict the old ones and the ones over the size limit.
+
+            Tests:
+            if the key is the same for equal inputs and differs for different ones
+            if a stored surface is loaded back exactly and a missing key gives None
+            if the surfaces older than the max age are evicted
+            if the oldest surfaces are evicted to respect the max size
+            if the kept surface is not evicted even if it alone exceeds the max size
+            if a corrupt surface gives None and is removed
+        """
+        Inputs = {'TimesArray': np.linspace(0.5, 2, 3), 'Volatility': Volatility, 'Engine': 'euler'}
+        assert c.computeCacheKey(Inputs) == c.computeCacheKey(dict(Inputs, TimesArray=np.linspace(0.5, 2, 3)))
+        assert c.computeCacheKey(Inputs) != c.computeCacheKey(dict(Inputs, Volatility=Volatility+1e-12))
+        Surface = f.generatePricesSurface(np.linspace(0.5, 2, 3), np.linspace(0.5, 1.5, 4), 20, 1000,
+            InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed)
+        with tempfile.TemporaryDirectory() as Directory:
+            Key = c.computeCacheKey(Inputs)
+            assert c.loadSurface(Directory, Key) is None
+            c.saveSurface(Directory, Key, Surface)
+            Cached = c.loadSurface(Directory, Key)
+            assert set(Cached) == set(Surface)
+            for Name in Surface:
+                np.testing.assert_array_equal(Cached[Name], Surface[Name])
+            c.saveSurface(Directory, 'new', Surface)
+            os.utime(c.cachePath(Directory, Key), (0, 0))
+            assert c.evictCache(Directory, MaxAge=86400) == [Key]
+            c.saveSurface(Directory, 'newer', Surface)
+            os.utime(c.cachePath(Directory, 'new'), (1, 1))
+            assert c.evictCache(Directory, MaxSize=os.path.getsize(c.cachePath(Directory, 'newer'))) == ['new']
+            assert sorted(os.listdir(Directory)) == ['newer.npz']
+            assert c.evictCache(Directory, MaxSize=1, Keep='newer') == []
+            assert sorted(os.listdir(Directory)) == ['newer.npz']
+            with open(c.cachePath(Directory, 'newer'), 'r+b') as File:
+                File.truncate(100)
+            assert c.loadSurface(Directory, 'newer') is None
+            assert os.listdir(Directory) == []
+
+
+    def test_extendPricesSurface(self):
+        """ Test the incremental surface
+            Extending a surface with new expiration times and strikes has to
+            give the same surface of a full rebuild with the same seed.
+
+            Tests:
+            if the prices, errors, paths and volatilities are the ones of a full rebuild
+            if the cells of the previous grid have been reused
+            if with a target error only the rows without new strikes are reused
+            if with a memory ceiling that changes the blocks the cells are reused
+                and the new ones are the ones of a full rebuild
+        """
+        TimesArray, StrikeArray = np.array([0.5, 1]), np.array([0.8, 1, 1.2])
+        NewTimesArray, NewStrikeArray = np.array([0.25, 0.5, 1, 1.5]), np.array([0.7, 0.8, 0.9, 1, 1.2, 1.4])
+        for Settings in ({}, {'VarianceReduction': 'control,antithetic'}, {'Engine': 'terminal', 'Workers': 2}):
+            Previous = f.generatePricesSurface(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+                Volatility, RandomSeed, **Settings)
+            Previous['VolatilityMatrix'], Previous['IterationsMatrix'], Previous['ConvergedMatrix'] = \
+                f.findImpliedVolatilitySurface(Previous, InitialAssetPrice, RiskFreeReturn, 100, 1e-8)
+            Surface = f.generatePricesSurface(NewTimesArray, NewStrikeArray, 20, 1000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, PreviousSurface=Previous, **Settings)
+            Rebuild = f.generatePricesSurface(NewTimesArray, NewStrikeArray, 20, 1000, InitialAssetPrice,
+                RiskFreeReturn, Volatility, RandomSeed, **Settings)
+            assert Surface['ReusedMatrix'].sum() == 6
+            for Name in ('PricesMatrix', 'ErrorsMatrix', 'PathsMatrix'):
+                np.testing.assert_array_equal(Surface[Name], Rebuild[Name])
+            for Extended, Rebuilt in zip(f.findImpliedVolatilitySurface(Surface, InitialAssetPrice, RiskFreeReturn,
+                                                                        100, 1e-8, Previous),
+                                         f.findImpliedVolatilityMatrix(Rebuild['PricesMatrix'], InitialAssetPrice,
+                                             NewStrikeArray, NewTimesArray, RiskFreeReturn, 100, 1e-8)):
+                np.testing.assert_array_equal(Extended, Rebuilt)
+        Adaptive = {'TargetError': 1e-3, 'MaxSimulationNumbers': 4000}
+        Previous = f.generatePricesSurface(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, **Adaptive)
+        Surface = f.generatePricesSurface(NewTimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, PreviousSurface=Previous, **Adaptive)
+        Rebuild = f.generatePricesSurface(NewTimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, **Adaptive)
+        np.testing.assert_array_equal(Surface['ReusedMatrix'].all(axis=1), [False, True, True, False])
+        np.testing.assert_array_equal(Surface['PricesMatrix'], Rebuild['PricesMatrix'])
+        Surface = f.generatePricesSurface(NewTimesArray, NewStrikeArray, 20, 1000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, PreviousSurface=Previous, **Adaptive)
+        assert not Surface['ReusedMatrix'].any()
+        Previous = f.generatePricesSurface(TimesArray, StrikeArray, 20, 1000, InitialAssetPrice, RiskFreeReturn,
+            Volatility, RandomSeed, MaxMemory=0.01)
+        Surface = f.generatePricesSurface(NewTimesArray, NewStrikeArray, 20, 1000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, MaxMemory=0.01, PreviousSurface=Previous)
+        Rebuild = f.generatePricesSurface(NewTimesArray, NewStrikeArray, 20, 1000, InitialAssetPrice,
+            RiskFreeReturn, Volatility, RandomSeed, MaxMemory=0.01)
+        assert Surface['ReusedMatrix'].sum() == 6
+        np.testing.assert_allclose(Surface['PricesMatrix'], Rebuild['PricesMatrix'], rtol=1e-12)
+
+
     def test_blackScholesCallPrice(self):
         """ Test Black-Scholes formula
             This is the test of the implementation of a deterministic formula,
@@ -173,6 +631,70 @@ class Test(unittest.TestCase):
         self.assertAlmostEqual(f.blackScholesVegaGreek(InitialAssetPrice, Strike,
             Time, RiskFreeReturn, 2*Volatility), 31.47, 2)
 
+    def test_blackScholesGreeks(self):
+        """ Test the Black-Scholes Greeks
+            The closed form Greeks have to be the derivatives of the
+            Black-Scholes formula, and the ones of the surface have to be
+            taken at the implied volatilities.
+
+            Tests:
+            if the delta, gamma and theta are the finite differences of the price
+            if the Greeks of the surface are the ones of each cell
+            if the cells without an implied volatility have nan Greeks
+        """
+        StrikeArray = np.linspace(0.7, 1.3, 5)
+        Step = 1e-4
+        Price = lambda S, T: f.blackScholesCallPrice(S, StrikeArray, T, RiskFreeReturn, Volatility)
+        Parameters = (InitialAssetPrice, StrikeArray, Time, RiskFreeReturn, Volatility)
+        np.testing.assert_allclose(f.blackScholesDeltaGreek(*Parameters),
+            (Price(InitialAssetPrice+Step, Time)-Price(InitialAssetPrice-Step, Time))/(2*Step), atol=1e-7)
+        np.testing.assert_allclose(f.blackScholesGammaGreek(*Parameters),
+            (Price(InitialAssetPrice+Step, Time)-2*Price(InitialAssetPrice, Time)+
+             Price(InitialAssetPrice-Step, Time))/Step**2, atol=1e-4)
+        np.testing.assert_allclose(f.blackScholesThetaGreek(*Parameters),
+            -(Price(InitialAssetPrice, Time+Step)-Price(InitialAssetPrice, Time-Step))/(2*Step), atol=1e-7)
+        Surface = {'TimesArray': np.array([0.5, Time]), 'StrikeArray': StrikeArray,
+                   'VolatilityMatrix': np.array([[0.1, 0.2, 0.3, 0.4, np.nan], [0.2]*5])}
+        Greeks = f.findBlackScholesGreeksSurface(Surface, InitialAssetPrice, RiskFreeReturn)
+        assert set(Greeks) == {'BlackScholes' + Name + 'Matrix' for Name in f.GreekNames}
+        assert np.isnan(Greeks['BlackScholesVegaMatrix'][0,4])
+        self.assertEqual(Greeks['BlackScholesGammaMatrix'][0,2], f.blackScholesGammaGreek(InitialAssetPrice,
+            StrikeArray[2], 0.5, RiskFreeReturn, 0.3))
+        np.testing.assert_array_equal(Greeks['BlackScholesThetaMatrix'][1], f.blackScholesThetaGreek(*Parameters))
+
+    def test_blackScholesArrays(self):
+        """ Test Black-Scholes formulas on arrays
+            The Black-Scholes price and vega accept broadcastable arrays
+            and have to give the same values of the scalar calls.
+
+            Tests:
+            if the normal cdf and pdf are equal to the scipy.stats ones
+            if the prices and the vegas over a grid of strikes and times are
+                equal to the ones computed element by element
+            if the prices with zero time are equal to the intrinsic value
+            if the vegas with zero time or volatility are equal to zero
+        """
+        Points = np.linspace(-10, 10, 101)
+        np.testing.assert_allclose(f.normalCdf(Points), stats.norm.cdf(Points), rtol=1e-12)
+        np.testing.assert_allclose(f.normalPdf(Points), stats.norm.pdf(Points), rtol=1e-12)
+        StrikeArray = np.linspace(0.5, 1.5, 5)
+        TimesArray = np.array([0, 0.5, 1, 2])
+        PricesMatrix = f.blackScholesCallPrice(InitialAssetPrice, StrikeArray[np.newaxis,:],
+            TimesArray[:,np.newaxis], RiskFreeReturn, Volatility)
+        VegasMatrix = f.blackScholesVegaGreek(InitialAssetPrice, StrikeArray[np.newaxis,:],
+            TimesArray[:,np.newaxis], RiskFreeReturn, Volatility)
+        assert PricesMatrix.shape == VegasMatrix.shape == (4,5)
+        for i in range(len(TimesArray)):
+            for j in range(len(StrikeArray)):
+                self.assertEqual(PricesMatrix[i,j], f.blackScholesCallPrice(InitialAssetPrice,
+                    StrikeArray[j], TimesArray[i], RiskFreeReturn, Volatility))
+                self.assertEqual(VegasMatrix[i,j], f.blackScholesVegaGreek(InitialAssetPrice,
+                    StrikeArray[j], TimesArray[i], RiskFreeReturn, Volatility))
+        np.testing.assert_array_equal(PricesMatrix[0,:], np.maximum(InitialAssetPrice-StrikeArray,0))
+        np.testing.assert_array_equal(VegasMatrix[0,:], 0)
+        np.testing.assert_array_equal(f.blackScholesVegaGreek(InitialAssetPrice, StrikeArray,
+            Time, RiskFreeReturn, 0), 0)
+
     @given(Volatility = st.floats(min_value=0.1, max_value=0.9,
                                   allow_nan=False, allow_infinity=False))
     def test_findImpliedVolatility(self, Volatility):
@@ -194,6 +716,214 @@ class Test(unittest.TestCase):
         self.assertAlmostEqual(f.findImpliedVolatility(TargetValue, InitialAssetPrice,
             Strike, Time, RiskFreeReturn, 1000000, 1.0e-11), Volatility)
 
+    def test_findImpliedVolatilityMatrix(self):
+        """ Test batched implied volatility
+            This is a test that verify that the batched solver inverts a whole
+            matrix of Black-Scholes prices at once.
+
+            Tests:
+            if the implied volatilities are equal to the volatilities used to
+                compute the prices
+            if all the elements are flagged as converged with a number of
+                iterations smaller than the max number of iterations
+            if the elements are equal to the ones of the scalar solver
+        """
+        StrikeArray = np.linspace(0.8, 1.2, 5)
+        TimesArray = np.linspace(0.5, 2, 4)
+        VolatilityMatrix = np.linspace(0.2, 0.6, 20).reshape(4,5)
+        PricesMatrix = f.blackScholesCallPrice(InitialAssetPrice, StrikeArray[np.newaxis,:],
+            TimesArray[:,np.newaxis], RiskFreeReturn, VolatilityMatrix)
+        ImpliedMatrix, IterationsMatrix, ConvergedMatrix = f.findImpliedVolatilityMatrix(PricesMatrix,
+            InitialAssetPrice, StrikeArray, TimesArray, RiskFreeReturn, MaxIteration, Precision)
+        np.testing.assert_allclose(ImpliedMatrix, VolatilityMatrix, atol=1e-5)
+        assert ConvergedMatrix.all()
+        assert (IterationsMatrix < MaxIteration).all()
+        for i in range(len(TimesArray)):
+            for j in range(len(StrikeArray)):
+                self.assertAlmostEqual(ImpliedMatrix[i,j], f.findImpliedVolatility(PricesMatrix[i,j],
+                    InitialAssetPrice, StrikeArray[j], TimesArray[i], RiskFreeReturn, MaxIteration,
+                    Precision))
+
+    def test_findImpliedVolatilities(self):
+        """ Test safeguarded implied volatility
+            This is a test of the solver on the prices where the plain
+            Newton-Raphson method diverges or has no solution.
+
+            Tests:
+            if the prices below the intrinsic value or above the asset price
+                have no implied volatility and are not flagged as converged
+            if the deep out of the money and in the money prices, where the
+                vega is close to zero, converge in a few iterations
+            if the deep out of the money prices, below the precision, converge
+                to their volatility and not to the initial guess
+            if the initial guess is close to the volatility at the money
+        """
+        TargetValues = np.array([0.4, 1.2, 1e-6, 0.55])
+        StrikeArray = np.array([0.5, 0.5, 2, 0.5])
+        self.assertFalse(f.checkArbitrageBounds(TargetValues, InitialAssetPrice, StrikeArray,
+            Time, RiskFreeReturn)[:2].any())
+        with pytest.warns(UserWarning):
+            ImpliedArray, IterationsArray, ConvergedArray = f.findImpliedVolatilities(TargetValues,
+                InitialAssetPrice, StrikeArray, Time, RiskFreeReturn, MaxIteration, 1.0e-12)
+        assert np.isnan(ImpliedArray[:2]).all()
+        np.testing.assert_array_equal(IterationsArray[:2], 0)
+        np.testing.assert_array_equal(ConvergedArray, [False, False, True, True])
+        assert (IterationsArray < 50).all()
+        for j in (2, 3):
+            self.assertAlmostEqual(f.blackScholesCallPrice(InitialAssetPrice, StrikeArray[j], Time,
+                RiskFreeReturn, ImpliedArray[j]), TargetValues[j], 10)
+        StrikeArray, TimesArray = np.array([3, 3, 1.8]), np.array([0.01, 0.01, 0.25])
+        Volatilities = np.array([1.4, 1.5, 0.3])
+        TargetValues = f.blackScholesCallPrice(InitialAssetPrice, StrikeArray, TimesArray, RiskFreeReturn, Volatilities)
+        assert (TargetValues < 1e-5).all()
+        ImpliedArray, IterationsArray, ConvergedArray = f.findImpliedVolatilities(TargetValues, InitialAssetPrice,
+            StrikeArray, TimesArray, RiskFreeReturn, MaxIteration, 1.0e-8)
+        assert ConvergedArray.all()
+        np.testing.assert_allclose(ImpliedArray, Volatilities, atol=1e-8)
+        AtTheMoney = f.blackScholesCallPrice(InitialAssetPrice, 1, Time, RiskFreeReturn, Volatility)
+        self.assertAlmostEqual(f.guessImpliedVolatility(AtTheMoney, InitialAssetPrice, 1, Time,
+            RiskFreeReturn), Volatility, 2)
+
+    def test_processQuotes(self):
+        """ Test the batch of market quotes
+            The quotes have to be streamed in chunks and inverted as a whole
+            array by the batched Newton-Raphson method.
+
+            Tests:
+            if all the quotes are written, in the same order, with their volatilities
+            if the volatilities are the ones of the quotes inverted at once,
+                up to the rounding of the CSV
+            if the columns can be renamed
+        """
+        Generator = np.random.default_rng(RandomSeed)
+        Quotes = pd.DataFrame({'spot': Generator.uniform(80, 120, 1000), 'strike': Generator.uniform(80, 120, 1000),
+                               'expiry': Generator.uniform(0.5, 2, 1000), 'rate': RiskFreeReturn,
+                               'volatility': Generator.uniform(0.1, 0.5, 1000)})
+        Quotes['mid'] = f.blackScholesCallPrice(Quotes['spot'].to_numpy(), Quotes['strike'].to_numpy(),
+            Quotes['expiry'].to_numpy(), RiskFreeReturn, Quotes['volatility'].to_numpy())
+        with tempfile.TemporaryDirectory() as Directory:
+            InputPath, OutputPath = os.path.join(Directory, 'quotes.csv'), os.path.join(Directory, 'vols.csv')
+            Quotes.to_csv(InputPath, index=False)
+            Summary = q.processQuotes(InputPath, OutputPath, 100, 1e-10, ChunkSize=300,
+                                      QuoteColumns={'price': 'mid'})
+            Volatilities = pd.read_csv(OutputPath)
+        assert Summary == {'quotes': 1000, 'converged': 1000}
+        np.testing.assert_allclose(Volatilities['strike'], Quotes['strike'])
+        np.testing.assert_allclose(Volatilities['ImpliedVolatility'], Quotes['volatility'], atol=1e-6)
+        np.testing.assert_allclose(Volatilities['ImpliedVolatility'], f.findImpliedVolatilities(
+            Quotes['mid'], Quotes['spot'], Quotes['strike'], Quotes['expiry'], RiskFreeReturn, 100, 1e-10)[0],
+            rtol=1e-9)
+
+    def test_processParquetQuotes(self):
+        """ Test the batch of Parquet quotes
+            The Parquet quotes have to be streamed in record batches and
+            written as a Parquet file, without the rounding of the CSV.
+
+            Tests:
+            if all the quotes are written, in the same order, with their volatilities
+            if the volatilities are the ones of the quotes inverted at once
+            if the quotes outside the no-arbitrage bounds are not converged
+            if the CSV chunks with different inferred types are written in the same Parquet file
+        """
+        pytest.importorskip('pyarrow')
+        Generator = np.random.default_rng(RandomSeed)
+        Quotes = pd.DataFrame({'spot': Generator.uniform(80, 120, 1000), 'strike': Generator.uniform(80, 120, 1000),
+                               'expiry': Generator.uniform(0.5, 2, 1000), 'rate': RiskFreeReturn,
+                               'volatility': Generator.uniform(0.1, 0.5, 1000)})
+        Quotes['price'] = f.blackScholesCallPrice(Quotes['spot'].to_numpy(), Quotes['strike'].to_numpy(),
+            Quotes['expiry'].to_numpy(), RiskFreeReturn, Quotes['volatility'].to_numpy())
+        # Prices above the spot have no implied volatility
+        Quotes.loc[[10, 500], 'price'] = Quotes.loc[[10, 500], 'spot']+1
+        with tempfile.TemporaryDirectory() as Directory:
+            InputPath, OutputPath = os.path.join(Directory, 'quotes.parquet'), os.path.join(Directory, 'vols.pq')
+            Quotes.to_parquet(InputPath, index=False)
+            with pytest.warns(UserWarning, match='No-Arbitrage'):
+                Summary = q.processQuotes(InputPath, OutputPath, 100, 1e-10, ChunkSize=300)
+            Volatilities = pd.read_parquet(OutputPath)
+        assert Summary == {'quotes': 1000, 'converged': 998}
+        np.testing.assert_array_equal(Volatilities['strike'], Quotes['strike'])
+        np.testing.assert_array_equal(Volatilities['Converged'], ~Quotes.index.isin([10, 500]))
+        assert Volatilities['ImpliedVolatility'][[10, 500]].isna().all()
+        with pytest.warns(UserWarning, match='No-Arbitrage'):
+            Expected = f.findImpliedVolatilities(Quotes['price'], Quotes['spot'], Quotes['strike'], Quotes['expiry'],
+                RiskFreeReturn, 100, 1e-10)[0]
+        np.testing.assert_allclose(Volatilities['ImpliedVolatility'], Expected, rtol=1e-12)
+        # The first chunk has integer spots and rates, the second one float spots and rates
+        Quotes = pd.DataFrame({'spot': [100, 100, 100, 100.5, 99.5, 100.25], 'strike': [90, 100, 110, 90, 100, 110],
+                               'expiry': 1, 'rate': [0, 0, 0, 0.05, 0.05, 0.05]})
+        Quotes['price'] = f.blackScholesCallPrice(Quotes['spot'].to_numpy(), Quotes['strike'].to_numpy(), 1,
+            Quotes['rate'].to_numpy(), 0.2)
+        Lines = ['spot,strike,expiry,rate,price'] + ['%g,%g,%g,%g,%r' % tuple(Row.tolist()) for Row in Quotes.to_numpy()]
+        with tempfile.TemporaryDirectory() as Directory:
+            InputPath, OutputPath = os.path.join(Directory, 'quotes.csv'), os.path.join(Directory, 'vols.parquet')
+            with open(InputPath, 'w') as File:
+                File.write('\n'.join(Lines))
+            assert q.processQuotes(InputPath, OutputPath, 100, 1e-10, ChunkSize=3) == {'quotes': 6, 'converged': 6}
+            Volatilities = pd.read_parquet(OutputPath)
+        np.testing.assert_allclose(Volatilities['spot'], Quotes['spot'])
+        np.testing.assert_allclose(Volatilities['ImpliedVolatility'], 0.2, atol=1e-6)
+
+
+    def test_headless(self):
+        """ Test the headless run of vol.py
+            The run without charts and csv files must not import pandas nor
+            matplotlib, and must write only the requested matrices.
+
+            Tests:
+            if pandas and matplotlib are not imported
+            if the .npy matrices are written and the missing paths are skipped
+            if the prices are the ones of the surface
+            if an unknown instrumentation sink is an error
+        """
+        with tempfile.TemporaryDirectory() as Directory:
+            SettingsPath = os.path.join(Directory, 'settings.txt')
+            with open(SettingsPath, 'w') as File:
+                File.write('[settings]\nRiskFreeReturn = 0.05\nVolatility = 0.2\nSimulationNumbers = 1000\n'
+                           'IntervalsNumber = 20\nMaxIteration = 100\nPrecision = 1e-8\nRandomSeed = 20000\n'
+                           'Instrumentation = none\n[grid]\nTimesNumber = 3\nStrikesNumber = 4\n'
+                           '[paths]\nPricesMatrix: ' + os.path.join(Directory, 'PricesMatrix.npy') + '\n'
+                           'VolatilityChart:\n')
+            Script = ('import sys, vol; vol.main([sys.argv[1]]); '
+                      'print(sorted({"pandas", "matplotlib"} & set(sys.modules)))')
+            Output = subprocess.run([sys.executable, '-c', Script, SettingsPath], capture_output=True, text=True,
+                                    check=True, cwd=os.path.dirname(os.path.abspath(f.__file__))).stdout
+            assert Output.strip() == '[]'
+            assert sorted(os.listdir(Directory)) == ['PricesMatrix.npy', 'settings.txt']
+            Surface = f.generatePricesSurface(np.linspace(0.5, 2, 3), np.linspace(0.5, 1.5, 4), 20, 1000, 1, 0.05,
+                0.2, 20000)
+            np.testing.assert_array_equal(np.load(os.path.join(Directory, 'PricesMatrix.npy')),
+                                          Surface['PricesMatrix'])
+            with open(SettingsPath) as File:
+                Settings = File.read().replace('Instrumentation = none', 'Instrumentation = jsonlines')
+            with open(SettingsPath, 'w') as File:
+                File.write(Settings)
+            Run = subprocess.run([sys.executable, '-c', Script, SettingsPath], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(f.__file__)))
+            assert Run.returncode != 0 and 'Unknown instrumentation sink: jsonlines' in Run.stderr
+
+
+    def test_compareResults(self):
+        """ Test the benchmark comparison
+            The comparison has to flag only the cases that are slower or use
+            more memory than the baseline beyond the threshold.
+
+            Tests:
+            if a case within the threshold is not flagged
+            if a slower case and a case with more memory are flagged
+            if the cases missing from one of the results are skipped
+        """
+        Baseline = {'results': {'a': {'min': 1.0, 'peak_memory': 100},
+                                'b': {'min': 1.0, 'peak_memory': 100},
+                                'c': {'min': 1.0, 'peak_memory': 100}}}
+        Current = {'results': {'a': {'min': 1.1, 'peak_memory': 100},
+                               'b': {'min': 1.5, 'peak_memory': 200},
+                               'd': {'min': 1.0, 'peak_memory': 100}}}
+        Regressions = [(Comparison['key'], Comparison['measure'])
+                       for Comparison in bench.compareResults(Baseline, Current, 0.2)
+                       if Comparison['regression']]
+        assert Regressions == [('b', 'min'), ('b', 'peak_memory')]
+        assert len(bench.compareResults(Baseline, Current)) == 4
+
 
 if __name__ == '__main__':
     unittest.main()
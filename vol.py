@@ -1,73 +1,272 @@
 import numpy as np
-import pandas as pd
 import configparser
+import logging
+import subprocess
 import sys
+import os
+import tempfile
 import func as f
-import graph as g
-from datetime import datetime as dt
-
-# Loading of settings
-config = configparser.ConfigParser()
-try:
-    config.read(sys.argv[1])
-except IndexError:
-    print ("You did not specify a correct file! The default file will be loaded")
-    config.read('configuration.txt')
-RiskFreeReturn = float(config.get('settings', 'RiskFreeReturn'))
-Volatility = float(config.get('settings', 'Volatility'))
-SimulationNumbers = int(config.get('settings', 'SimulationNumbers'))
-IntervalsNumber = int(config.get('settings', 'IntervalsNumber'))
-MaxIteration = int(config.get('settings', 'MaxIteration'))
-Precision = float(config.get('settings', 'Precision'))
-RandomSeed = int(config.get('settings', 'RandomSeed'))
-
-#Loading names and path
-PricesMatrixPath = config.get('paths', 'PricesMatrix')
-VolatilityMatrixPath = config.get('paths', 'VolatilityMatrix')
-PricesChartPath = config.get('paths', 'PricesChart')
-VolatilityChartPath = config.get('paths', 'VolatilityChart')
-
-
-InitialAssetPrice = 1
-MaxTime = 2
-MaxStrike = 1.5
-TimesArrayIntervals = 10
-StrikesArrayIntervals = 10
-
-
-# Create the array for strike and time
-TimesArray = np.linspace(0.5, MaxTime, TimesArrayIntervals)
-StrikeArray = np.linspace(0.5, MaxStrike, StrikesArrayIntervals)
-
-# Create the meshgrid
-StrikesMeshgrid, TimesMeshgrid = np.meshgrid(StrikeArray, TimesArray)
-VolatilityMatrix = np.empty(shape=(TimesArrayIntervals, StrikesArrayIntervals))
-
-# Set the random seed
-np.random.seed(RandomSeed)
-
-# Fix the zero time
-InitialTime = dt.now()
-
-# Compute the price matrix
-PricesMatrix = f.generatePricesMatrix(TimesArray, StrikeArray, IntervalsNumber, SimulationNumbers,
-                               InitialAssetPrice, RiskFreeReturn, Volatility)
-
-# Find the implied volatility matrix
-for i in range(len(TimesArray)):
-    for j in range(len(StrikeArray)):
-        VolatilityMatrix[i,j] = f.findImpliedVolatility(PricesMatrix[i,j], InitialAssetPrice, StrikeArray[j],
-                                                           TimesArray[i], RiskFreeReturn, MaxIteration, Precision)
-
-# Total time
-print('All Done! Time: ', dt.now()-InitialTime)
-
-#Price Matrix
-pd.DataFrame(PricesMatrix, index=TimesArray, columns=StrikeArray).to_csv(PricesMatrixPath)
-#Volatility Matrix
-pd.DataFrame(VolatilityMatrix, index=TimesArray, columns=StrikeArray).to_csv(VolatilityMatrixPath)
-
-# Price Chart
-g.generatePriceChart(StrikesMeshgrid, TimesMeshgrid, PricesMatrix, PricesChartPath)
-# Volatility Chart
-g.generateImpliedVolatilityChart(StrikesMeshgrid, TimesMeshgrid, VolatilityMatrix, VolatilityChartPath)
+import instrumentation as ins
+import cache as c
+
+# pandas and the charts (matplotlib) are imported only when their outputs are
+# requested, so the headless runs do not spend their time loading them
+
+
+def loadGrid(config, Name, Minimum, Maximum, Number):
+    """ Grid of the surface
+        This method loads the evenly spaced points of the grid from the
+        settings, together with the extra points, as new wings or expiries.
+
+        Parameters
+            config : the loaded settings
+            Name : the name of the grid, Times or Strikes
+            Minimum, Maximum, Number : the default range and number of points
+
+        Returns
+            The sorted array of the points
+    """
+    Grid = np.linspace(float(config.get('grid', 'Min' + Name, fallback=Minimum)),
+                       float(config.get('grid', 'Max' + Name, fallback=Maximum)),
+                       int(config.get('grid', Name + 'Number', fallback=Number)))
+    Extra = [float(Value) for Value in config.get('grid', 'Extra' + Name, fallback='').split(',') if Value.strip()]
+    return np.unique(np.concatenate([Grid, Extra]))
+
+
+def writeMatrix(Path, Matrix, TimesArray, StrikeArray):
+    """ Write a matrix
+        This method writes a matrix of the surface, by the extension of the
+        path: a .npy file with numpy alone, otherwise a csv file with the
+        expiration times as rows and the strikes as columns, with pandas.
+
+        Parameters
+            Path : the path of the file
+            Matrix : the matrix
+            TimesArray : the expiration times of the rows
+            StrikeArray : the strikes of the columns
+    """
+    if os.path.splitext(Path)[1].lower() == '.npy':
+        np.save(Path, Matrix)
+    else:
+        import pandas as pd
+        pd.DataFrame(Matrix, index=TimesArray, columns=StrikeArray).to_csv(Path)
+
+
+def siblingPath(Path, Name):
+    """ Path of a sibling matrix
+        This method builds the path of a matrix in the same directory and
+        with the same extension of another one, as the Greeks next to the
+        prices.
+
+        Parameters
+            Path : the path of the other matrix, None if it is not written
+            Name : the name of the matrix
+
+        Returns
+            The path of the matrix, None if the other one is not written
+    """
+    if not Path:
+        return None
+    return os.path.join(os.path.dirname(Path), Name + os.path.splitext(Path)[1])
+
+
+def startCharts(Surface, PricesChartPath=None, VolatilityChartPath=None):
+    """ Background charts
+        This method renders the charts in another process, that reads the
+        surface from a temporary file, removes it and goes on after the end
+        of the run.
+
+        Parameters
+            Surface : the dictionary of the matrices
+            PricesChartPath : the path to save the price chart, None to skip it
+            VolatilityChartPath : the path to save the volatility chart, None to skip it
+
+        Returns
+            The subprocess.Popen of the process
+    """
+    Descriptor, SurfacePath = tempfile.mkstemp(suffix='.npz')
+    with os.fdopen(Descriptor, 'wb') as File:
+        np.savez(File, **{Name: Surface[Name] for Name in ('TimesArray', 'StrikeArray', 'PricesMatrix',
+                                                           'VolatilityMatrix')})
+    GraphPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'graph.py')
+    return subprocess.Popen([sys.executable, GraphPath, SurfacePath, PricesChartPath or '', VolatilityChartPath or '',
+                             '--remove'], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def main(Arguments=None):
+    """ Implied volatility surface
+        This method computes the surface of the settings file and writes its
+        matrices and charts.
+
+        Parameters
+            Arguments : the list of the command line arguments, the settings
+                        file and --force to ignore the cached surfaces, None for sys.argv
+    """
+    Arguments = sys.argv[1:] if Arguments is None else Arguments
+
+    # Loading of settings
+    config = configparser.ConfigParser()
+    try:
+        config.read([Argument for Argument in Arguments if Argument != '--force'][0])
+    except IndexError:
+        print ("You did not specify a correct file! The default file will be loaded")
+        config.read('configuration.txt')
+    RiskFreeReturn = float(config.get('settings', 'RiskFreeReturn'))
+    Volatility = float(config.get('settings', 'Volatility'))
+    SimulationNumbers = int(config.get('settings', 'SimulationNumbers'))
+    IntervalsNumber = int(config.get('settings', 'IntervalsNumber'))
+    MaxIteration = int(config.get('settings', 'MaxIteration'))
+    Precision = float(config.get('settings', 'Precision'))
+    RandomSeed = int(config.get('settings', 'RandomSeed'))
+    MaxMemory = config.get('settings', 'MaxMemory', fallback=None)
+    MaxMemory = float(MaxMemory) if MaxMemory else None
+    Workers = int(config.get('settings', 'Workers', fallback=os.cpu_count()))
+    Workers = Workers if config.getboolean('settings', 'Parallel', fallback=False) else None
+    VarianceReduction = config.get('settings', 'VarianceReduction', fallback='none')
+    Engine = f.checkEngine(config.get('settings', 'Engine', fallback='euler'))
+    Backend = f.checkBackend(config.get('settings', 'Backend', fallback='numpy'))
+    DataType = f.checkDataType(config.get('settings', 'DataType', fallback='float64'), Backend).name
+    TargetError = config.get('settings', 'TargetError', fallback=None)
+    TargetError = float(TargetError) if TargetError else None
+    RelativeError = config.get('settings', 'TargetErrorType', fallback='absolute').strip().lower() == 'relative'
+    MaxSimulationNumbers = config.get('settings', 'MaxSimulationNumbers', fallback=None)
+    MaxSimulationNumbers = int(MaxSimulationNumbers) if MaxSimulationNumbers else None
+    Greeks = config.getboolean('settings', 'Greeks', fallback=False)
+
+    #Loading names and path, an empty or missing path skips its output
+    PricesMatrixPath = config.get('paths', 'PricesMatrix', fallback=None)
+    VolatilityMatrixPath = config.get('paths', 'VolatilityMatrix', fallback=None)
+    PricesChartPath = config.get('paths', 'PricesChart', fallback=None)
+    VolatilityChartPath = config.get('paths', 'VolatilityChart', fallback=None)
+    BackgroundCharts = config.getboolean('paths', 'BackgroundCharts', fallback=False)
+    ErrorsMatrixPath = config.get('paths', 'ErrorsMatrix', fallback=None)
+    PathsMatrixPath = config.get('paths', 'PathsMatrix', fallback=None)
+    InstrumentationLogPath = config.get('paths', 'InstrumentationLog', fallback='./instrumentation.jsonl')
+    SurfacePath = config.get('paths', 'Surface', fallback=None)
+
+    # Loading of the cache settings
+    CacheDirectory = config.get('cache', 'Directory', fallback=None)
+    MaxCacheSize = config.get('cache', 'MaxSize', fallback=None)
+    MaxCacheSize = float(MaxCacheSize)*2**20 if MaxCacheSize else None
+    MaxCacheAge = config.get('cache', 'MaxAge', fallback=None)
+    MaxCacheAge = float(MaxCacheAge)*86400 if MaxCacheAge else None
+    ForceRecompute = config.getboolean('cache', 'ForceRecompute', fallback=False) or '--force' in Arguments
+
+    # Instrumentation sinks
+    Sinks = []
+    for Sink in config.get('settings', 'Instrumentation', fallback='logging').split(','):
+        Sink = Sink.strip().lower()
+        if Sink == 'logging':
+            logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+            Sinks.append(ins.loggingSink())
+        elif Sink == 'jsonl':
+            Sinks.append(ins.jsonLinesSink(InstrumentationLogPath))
+        elif Sink not in ('none', ''):
+            raise ValueError("Unknown instrumentation sink: " + Sink)
+    Instrumentation = ins.Instrumentation(Sinks)
+
+
+    InitialAssetPrice = 1
+
+    # Create the array for strike and time
+    TimesArray = loadGrid(config, 'Times', 0.5, 2, 10)
+    StrikeArray = loadGrid(config, 'Strikes', 0.5, 1.5, 10)
+
+    # Look for the surfaces in the cache, the key hashes all the inputs of the
+    # results but the number of workers and the memory ceiling, that do not change them
+    Settings = {'InitialAssetPrice': InitialAssetPrice, 'RiskFreeReturn': RiskFreeReturn, 'Volatility': Volatility,
+                'SimulationNumbers': SimulationNumbers, 'IntervalsNumber': IntervalsNumber, 'RandomSeed': RandomSeed,
+                'VarianceReduction': sorted(f.parseVarianceReduction(VarianceReduction)),
+                'Engine': Engine, 'DataType': DataType,
+                'Backend': Backend, 'TargetError': TargetError, 'RelativeError': RelativeError,
+                'MaxSimulationNumbers': MaxSimulationNumbers, 'MaxIteration': MaxIteration, 'Precision': Precision,
+                'Greeks': Greeks}
+    SettingsKey = c.computeCacheKey(Settings)
+    CacheKey = c.computeCacheKey(dict(Settings, TimesArray=TimesArray, StrikeArray=StrikeArray))
+    Surface = None
+    if CacheDirectory and not ForceRecompute:
+        with Instrumentation.stage('cache'):
+            Surface = c.loadSurface(CacheDirectory, CacheKey)
+        Instrumentation.record('cache', key=CacheKey, hit=Surface is not None)
+
+    if Surface is None:
+        # The previous surface of the same settings, whose cells of the grid are reused
+        PreviousSurface = None
+        if SurfacePath and not ForceRecompute and os.path.exists(SurfacePath):
+            PreviousSurface = c.readSurface(SurfacePath)
+            if PreviousSurface is not None and str(PreviousSurface.get('SettingsKey')) != SettingsKey:
+                PreviousSurface = None
+
+        # Compute the price matrix
+        Surface = f.generatePricesSurface(TimesArray, StrikeArray, IntervalsNumber, SimulationNumbers,
+                                       InitialAssetPrice, RiskFreeReturn, Volatility, RandomSeed, MaxMemory,
+                                       Workers, VarianceReduction, TargetError, RelativeError,
+                                       MaxSimulationNumbers, Engine, Instrumentation, PreviousSurface, DataType,
+                                       Backend, Greeks)
+        Surface['SettingsKey'] = np.array(SettingsKey)
+        Instrumentation.record('reuse', cells=int(Surface['ReusedMatrix'].sum()),
+                               total=int(Surface['ReusedMatrix'].size))
+
+        # Find the implied volatility matrix
+        with Instrumentation.stage('inversion'):
+            Surface['VolatilityMatrix'], Surface['IterationsMatrix'], Surface['ConvergedMatrix'] = \
+                f.findImpliedVolatilitySurface(Surface, InitialAssetPrice, RiskFreeReturn, MaxIteration, Precision,
+                                               PreviousSurface)
+        Instrumentation.record('inversion', iterations=Surface['IterationsMatrix'].tolist(),
+                               converged=int(Surface['ConvergedMatrix'].sum()),
+                               cells=int(Surface['ConvergedMatrix'].size))
+
+        # The closed form Greeks at the implied volatilities
+        if Greeks:
+            with Instrumentation.stage('greeks'):
+                Surface.update(f.findBlackScholesGreeksSurface(Surface, InitialAssetPrice, RiskFreeReturn))
+
+        if CacheDirectory:
+            with Instrumentation.stage('cache'):
+                c.saveSurface(CacheDirectory, CacheKey, Surface)
+                Removed = c.evictCache(CacheDirectory, MaxCacheSize, MaxCacheAge, CacheKey)
+            Instrumentation.record('cache', key=CacheKey, stored=True, evicted=len(Removed))
+
+    # Store the surface, to be extended by the next run with another grid
+    if SurfacePath:
+        c.writeSurface(SurfacePath, Surface)
+
+    # Price, Volatility, Standard Errors and Simulated Paths Matrices
+    Outputs = [(PricesMatrixPath, 'PricesMatrix'), (VolatilityMatrixPath, 'VolatilityMatrix'),
+               (ErrorsMatrixPath, 'ErrorsMatrix'), (PathsMatrixPath, 'PathsMatrix')]
+    # Greeks Matrices, by default next to the prices and their errors next to the standard errors
+    if Greeks:
+        for Greek in f.GreekNames:
+            for Path, Name in ((PricesMatrixPath, Greek + 'Matrix'),
+                               (PricesMatrixPath, 'BlackScholes' + Greek + 'Matrix'),
+                               (ErrorsMatrixPath, Greek + 'ErrorsMatrix')):
+                Outputs.append((config.get('paths', Name, fallback=siblingPath(Path, Name)), Name))
+
+    with Instrumentation.stage('csv'):
+        for Path, Name in Outputs:
+            if Path:
+                writeMatrix(Path, Surface[Name], TimesArray, StrikeArray)
+
+    if PricesChartPath or VolatilityChartPath:
+        with Instrumentation.stage('charts'):
+            if BackgroundCharts:
+                Process = startCharts(Surface, PricesChartPath, VolatilityChartPath)
+                Instrumentation.record('charts', background=True, pid=Process.pid)
+            else:
+                import graph as g
+                StrikesMeshgrid, TimesMeshgrid = np.meshgrid(StrikeArray, TimesArray)
+                # Price Chart
+                if PricesChartPath:
+                    g.generatePriceChart(StrikesMeshgrid, TimesMeshgrid, Surface['PricesMatrix'], PricesChartPath)
+                # Volatility Chart
+                if VolatilityChartPath:
+                    g.generateImpliedVolatilityChart(StrikesMeshgrid, TimesMeshgrid, Surface['VolatilityMatrix'],
+                                                     VolatilityChartPath)
+
+    # Timings of all the stages
+    Instrumentation.report()
+
+
+if __name__ == '__main__':
+    main()